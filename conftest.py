@@ -0,0 +1,5 @@
+# conftest.py
+# ---------
+# Lets pytest, run from the project folder, import connect4 and utils the
+# way the game itself does.
+#
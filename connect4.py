@@ -35,6 +35,8 @@ A Board() class is provided to simulate the game board.
 It has the following properties:
     b.rows          # number of rows of the game board
     b.cols          # number of columns of the game board
+    b.k             # number of discs in a line needed to win, 4 unless the
+                    # board was built as Board(rows, cols, k) for Connect-K
     b.PLAYER1       # an integer flag to represent the player 1
     b.PLAYER2       # an integer flag to represent the player 2
     b.EMPTY_SLOT    # an integer flag to represent an empty slot in the board;
@@ -49,6 +51,16 @@ and the following methods:
                             # is no winner yet 
                             # w should be in [b.PLAYER1,b.PLAYER2, None]
 
+    b.last_move()           # (row, col) of the last disc placed or None
+
+    b.moves()               # the columns of all discs placed, in order
+
+    b.canonical_key()       # a hash of the position, the same for its
+                            # left-right mirror image
+
+    b.canonical_col(col)    # col mapped to the mirrored board if the
+                            # canonical position is the mirror image
+
     b.occupied(row, col)    # check if the slot at the specific location is
                             # occupied
 
@@ -59,6 +71,8 @@ and the following methods:
                             # b.PLAYER1, b.PLAYER2 and b.EMPTY_SLOT
 
     col = b.column(r)       # get a specific column of the game board
+                            # (Board returns read-only views of its slots
+                            # for both; use list(row) for a copy)
 
     b.placeable(col)        # check if a disc can be placed at the specific
                             # column
@@ -71,6 +85,11 @@ and the following methods:
 
     str = b.dump()          # a string to describe the game board using
                             # b.PLAYER1, b.PLAYER2 and b.EMPTY_SLOT
+
+utils.bitboard.BitBoard provides the same interface with each player's discs
+kept in an integer bitboard. utils.bitboard.ScoredBitBoard additionally keeps
+per-window disc counts so that evaluate() is a lookup on it; it is what the
+GUI plays on by default.
 Hints:
     1. Depth-limited Search
         We use depth-limited search in the current code. That is we
@@ -100,6 +119,13 @@ Hints:
 # use math library if needed
 import math
 import random
+import time
+
+from utils.transposition import EXACT, LOWER, UPPER, TranspositionTable, zobrist_keys
+from utils.vectorized import child_arrays, evaluate_batch, grandchild_arrays
+from utils.errors import SearchTimeout, SearchCancelled
+from utils.windows import weights, windows, score_bound
+
 
 def get_child_boards(player, board):
     """
@@ -118,13 +144,54 @@ def get_child_boards(player, board):
     where col is the column in which a new disc is placed (left column has a 0 index), 
     and new_board is the resulting board instance
     """
-    res = []
+    return list(iter_child_boards(player, board))
+
+
+def iter_child_boards(player, board, inplace=False, order=None):
+    """
+    Lazy version of get_child_boards: each successor board is only built
+    when the iteration reaches it, so a search that stops early (a cutoff)
+    never pays for the children it does not visit.
+
+    Parameters
+    ----------
+    player: board.PLAYER1 or board.PLAYER2
+        the player that will place a disc on the board
+    board: the current board instance
+    inplace: boolean
+        if True, the discs are placed on the given board itself instead of
+        on clones of it, and the caller must call board.undo() after visiting
+        each child and before asking for the next one
+    order: iterable of int or None
+        the columns to try, in the order to try them; all columns from left
+        to right by default
+
+    Returns
+    -------
+    an iterator of (col, new_board) tuples, see get_child_boards
+    """
+    if order is None:
+        order = range(board.cols)
+    for c in order:
+        if board.placeable(c):
+            if inplace:
+                child = board
+            else:
+                child = board.clone()
+            child.place(player, c)
+            yield (c, child)
+
+
+def count_child_boards(board):
+    """
+    Number of successors of the given board, i.e. the number of columns
+    that are not full, without building any of them.
+    """
+    n = 0
     for c in range(board.cols):
         if board.placeable(c):
-            tmp_board = board.clone()
-            tmp_board.place(player, c)
-            res.append((c, tmp_board))
-    return res
+            n += 1
+    return n
 
 
 def evaluate(player, board):
@@ -144,66 +211,105 @@ def evaluate(player, board):
         a scalar to evaluate the advantage of the specific player at the given
         game board
     """
+    if hasattr(board, "score"):
+        # boards such as utils.bitboard.ScoredBitBoard keep the window counts
+        # and the weighted totals below up to date on every place/undo
+        return board.score(player)
     adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
-    # Initialize the value of scores
-    # [s0, s1, s2, s3, --s4--]
-    # s0 for the case where all slots are empty in a 4-slot segment
-    # s1 for the case where the player occupies one slot in a 4-slot line, the rest are empty
-    # s2 for two slots occupied
-    # s3 for three
-    # s4 for four
-    score = [0]*5
-    adv_score = [0]*5
-
-    # Initialize the weights
-    # [w0, w1, w2, w3, --w4--]
-    # w0 for s0, w1 for s1, w2 for s2, w3 for s3
-    # w4 for s4
-    weights = [0, 1, 4, 16, 1000]
-
-    # Obtain all 4-slot segments on the board
-    seg = []
-    invalid_slot = -1
-    left_revolved = [
-        [invalid_slot]*r + board.row(r) + \
-        [invalid_slot]*(board.rows-1-r) for r in range(board.rows)
-    ]
-    right_revolved = [
-        [invalid_slot]*(board.rows-1-r) + board.row(r) + \
-        [invalid_slot]*r for r in range(board.rows)
-    ]
+    # Weights of a K-slot segment (window) holding 0, 1, ..., K discs of a
+    # single player, see utils.windows; K is 4 unless the board says else
+    k = getattr(board, "k", 4)
+    w = weights(k)
+
+    # The slots of the board, row by row, indexed as r*cols + c by the
+    # precomputed windows: horizontal, vertical, slash and backslash
+    slots = []
     for r in range(board.rows):
-        # row
-        row = board.row(r) 
-        for c in range(board.cols-3):
-            seg.append(row[c:c+4])
-    for c in range(board.cols):
-        # col
-        col = board.col(c) 
-        for r in range(board.rows-3):
-            seg.append(col[r:r+4])
-    for c in zip(*left_revolved):
-        # slash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    for c in zip(*right_revolved): 
-        # backslash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    # compute score
-    for s in seg:
-        if invalid_slot in s:
-            continue
-        if adversary not in s:
-            score[s.count(player)] += 1
-        if player not in s:
-            adv_score[s.count(adversary)] += 1
-    reward = sum([s*w for s, w in zip(score, weights)])
-    penalty = sum([s*w for s, w in zip(adv_score, weights)])
+        slots.extend(board.row(r))
+    reward = penalty = 0
+    for window in windows(board.rows, board.cols, k):
+        mine = theirs = 0
+        for i in window:
+            s = slots[i]
+            if s == player:
+                mine += 1
+            elif s == adversary:
+                theirs += 1
+        # a window only counts for a player the adversary has no disc in
+        if theirs == 0:
+            reward += w[mine]
+        if mine == 0:
+            penalty += w[theirs]
     return reward - penalty
 
 
-def minimax(player, board, depth_limit):
+def _tt_context(max_player, board):
+    """
+    Per-search constants for transposition table lookups: the key to xor in
+    for each side to move, and the sign turning scores of max_player into
+    scores of board.PLAYER1, so that a table can be shared by both players.
+    """
+    side = {board.PLAYER1: 0, board.PLAYER2: zobrist_keys(board.rows, board.cols)[0][0]}
+    return side, 1 if max_player == board.PLAYER1 else -1
+
+
+def _tt_flag(flag, sign):
+    # a lower bound for one player is an upper bound for the other
+    if sign > 0 or flag == EXACT:
+        return flag
+    return LOWER if flag == UPPER else UPPER
+
+
+def _last_ply(player, max_player, board, stats=None, ply=0):
+    # the columns of all children of board and their evaluation for
+    # max_player, computed in one vectorized call
+    if stats is not None:
+        t = time.perf_counter()
+    cols, children = child_arrays(player, board)
+    scores = evaluate_batch(max_player, children, getattr(board, "k", 4)).tolist()
+    if stats is not None:
+        stats.batch(ply+1, len(cols), time.perf_counter() - t)
+    return zip(cols, scores)
+
+
+def _last_two_plies(player, adversary, max_player, board, stats=None, ply=0):
+    # the columns of all children of board, whether each of them ends the
+    # game, and the evaluations for max_player of its own children after
+    # adversary moves (of itself when it ends the game), all computed in one
+    # vectorized call
+    if stats is not None:
+        t = time.perf_counter()
+    children, boards = grandchild_arrays(player, adversary, board)
+    scores = evaluate_batch(max_player, boards, getattr(board, "k", 4)).tolist()
+    if stats is not None:
+        stats.frontier(ply+1, [n for _, n in children], time.perf_counter() - t)
+    res, i = [], 0
+    for col, n in children:
+        res.append((col, n == 0, scores[i:i+max(n, 1)]))
+        i += max(n, 1)
+    return res
+
+
+def _evaluate_child(player, col, board):
+    # evaluate() of the board after player places a disc in col, for the
+    # player placing it
+    board.place(player, col)
+    try:
+        return evaluate(player, board)
+    finally:
+        board.undo()
+
+
+def _children(player, board, inplace, order=None, stats=None):
+    # iter_child_boards, counted and timed by stats if given
+    children = iter_child_boards(player, board, inplace, order)
+    if stats is None:
+        return children
+    return stats.successors(children)
+
+
+def minimax(player, board, depth_limit, inplace=True, tt=None, deadline=None,
+            batch=False, max_player=None, return_score=False, stop=None, stats=None):
     """
     Minimax algorithm with limited search depth.
 
@@ -214,7 +320,38 @@ def minimax(player, board, depth_limit):
     board: the current game board instance
     depth_limit: int
         the tree depth that the search algorithm needs to go further before stopping
-    max_player: boolean
+    max_player: board.PLAYER1 or board.PLAYER2 or None
+        the player the search evaluates the game for; the player to move by
+        default. When it is the other player, the root is searched as a
+        MIN (or CHANCE) node, e.g. to score one root move on its own
+    inplace: boolean
+        walk the tree by placing and undoing discs on the given board instead
+        of cloning it at every node; False keeps the clone-based reference path
+    tt: utils.transposition.TranspositionTable or None
+        table of searched positions to reuse across transpositions, keyed by
+        the board's canonical Zobrist hash so that a position and its mirror
+        image share an entry; entries only answer a lookup at the depth
+        they were searched to, so the result is the same as without a table
+    deadline: float or None
+        time.perf_counter() value after which the search gives up by raising
+        SearchTimeout; the board is restored before the exception propagates
+    stop: threading.Event or None
+        the search gives up by raising SearchCancelled once it is set, e.g.
+        from another thread when the game the search is for is abandoned
+    stats: utils.stats.SearchStats or None
+        counters to add the work done by the search to: nodes per ply, leaf
+        evaluations, terminal positions, successors generated, and the time
+        spent on each
+    batch: boolean
+        expand the last two plies of the tree as arrays and evaluate all the
+        leaves under a node with utils.vectorized.evaluate_batch in one call;
+        requires numpy and gives the same result as evaluate() leaf by leaf.
+        Only pays off with boards that evaluate by scanning their windows,
+        such as utils.app.Board: on utils.bitboard.ScoredBitBoard, whose
+        evaluation is kept up to date move by move, it is slower
+
+    return_score: boolean
+        return (score, placement) instead of placement alone
 
     Returns
     -------
@@ -223,26 +360,64 @@ def minimax(player, board, depth_limit):
         (counted from the most left as 0)
         None to give up the game
     """
-    max_player = player
+    if max_player is None:
+        max_player = player
     placement = None
     
     
-    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    next_player = board.PLAYER2 if max_player == board.PLAYER1 else board.PLAYER1
     score = -math.inf
 ### Please finish the code below ##############################################
 ###############################################################################
+    root_depth = depth_limit
+    if tt is not None:
+        side, sign = _tt_context(max_player, board)
+
     def value(player, board, depth_limit):
-        if depth_limit == 0 or board.terminal():
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout()
+        if stop is not None and stop.is_set():
+            raise SearchCancelled()
+        if stats is not None:
+            stats.node(root_depth-depth_limit)
+            if stats.leaf(board, depth_limit):
+                return [stats.evaluate(evaluate, max_player, board), None]
+        elif depth_limit == 0 or board.terminal():
             return [evaluate(max_player, board), None]
+        if tt is not None:
+            key = board.canonical_key() ^ side[player]
+            entry = tt.probe(key) if depth_limit < root_depth else None
+            if entry is not None and entry[1] == depth_limit and entry[2] == EXACT:
+                return [sign*entry[3], board.canonical_col(entry[4])]
         if player == max_player:                      
-            return max_value(player,board,depth_limit)
+            res = max_value(player,board,depth_limit)
         else:
-            return min_value(player,board,depth_limit)  
+            res = min_value(player,board,depth_limit)  
+        if tt is not None:
+            tt.store(key, depth_limit, EXACT, sign*res[0], board.canonical_col(res[1]))
+        return res
 
     def max_value(player, board, depth_limit):
         v = -math.inf
-        for child in get_child_boards(player, board):
-            next_value = value(next_player, child[1], depth_limit-1)[0]
+        if batch and depth_limit == 2:
+            for col, leaf, scores in _last_two_plies(player, next_player, max_player, board, stats, root_depth-depth_limit):
+                next_value = scores[0] if leaf else min(scores)
+                if v <= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        if batch and depth_limit == 1:
+            for col, next_value in _last_ply(player, max_player, board, stats, root_depth-depth_limit):
+                if v <= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        for child in _children(player, board, inplace, stats=stats):
+            try:
+                next_value = value(next_player, child[1], depth_limit-1)[0]
+            finally:
+                if inplace:
+                    board.undo()
             if v <= next_value:
                 v = next_value
                 action = child[0]
@@ -250,19 +425,46 @@ def minimax(player, board, depth_limit):
     
     def min_value(player, board, depth_limit):
         v = math.inf
-        for child in get_child_boards(player, board):
-            next_value = value(max_player, child[1], depth_limit-1)[0]
+        if batch and depth_limit == 2:
+            for col, leaf, scores in _last_two_plies(player, max_player, max_player, board, stats, root_depth-depth_limit):
+                next_value = scores[0] if leaf else max(scores)
+                if v >= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        if batch and depth_limit == 1:
+            for col, next_value in _last_ply(player, max_player, board, stats, root_depth-depth_limit):
+                if v >= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        for child in _children(player, board, inplace, stats=stats):
+            try:
+                next_value = value(max_player, child[1], depth_limit-1)[0]
+            finally:
+                if inplace:
+                    board.undo()
             if v >= next_value:
                 v = next_value
                 action = child[0]
         return [v, action]
 
-    score, placement = value(player, board, depth_limit)
+    if stats is not None:
+        started = stats.start()
+    try:
+        score, placement = value(player, board, depth_limit)
+    finally:
+        if stats is not None:
+            stats.finish(started)
 ###############################################################################
+    if return_score:
+        return score, placement
     return placement
 
 
-def alphabeta(player, board, depth_limit):
+def alphabeta(player, board, depth_limit, inplace=True, tt=None, deadline=None,
+              first=None, ordering=None, stats=None, alpha=-math.inf, beta=math.inf,
+              max_player=None, return_score=False, stop=None, solver=None, pvs=False):
     """
     Minimax algorithm with alpha-beta pruning.
 
@@ -275,8 +477,49 @@ def alphabeta(player, board, depth_limit):
         the tree depth that the search algorithm needs to go further before stopping
     alpha: float
     beta: float
-    max_player: boolean
+        the search window at the root; the returned score is exact when it
+        lies strictly between them, and a bound on the exact one otherwise
+    max_player: board.PLAYER1 or board.PLAYER2 or None
+        the player the search evaluates the game for; the player to move by
+        default. When it is the other player, the root is searched as a
+        MIN (or CHANCE) node, e.g. to score one root move on its own
+    inplace: boolean
+        walk the tree by placing and undoing discs on the given board instead
+        of cloning it at every node; False keeps the clone-based reference path
+    tt: utils.transposition.TranspositionTable or None
+        table of searched positions to reuse across transpositions, keyed by
+        the board's canonical Zobrist hash so that a position and its mirror
+        image share an entry; entries only answer a lookup at the depth
+        they were searched to, so the result is the same as without a table
+    deadline: float or None
+        time.perf_counter() value after which the search gives up by raising
+        SearchTimeout; the board is restored before the exception propagates
+    stop: threading.Event or None
+        the search gives up by raising SearchCancelled once it is set, e.g.
+        from another thread when the game the search is for is abandoned
+    first: int or None
+        column to search first at the root, such as the best move of a
+        shallower search
+    ordering: utils.ordering.MoveOrdering or None
+        move ordering heuristics; columns are visited left to right if None
+    solver: utils.solver.Solver or None
+        exact endgame solver: once at most solver.threshold cells are empty,
+        the move is the one found by searching the game to its end, unless
+        that takes longer than the solver's time cap, in which case the
+        depth-limited search runs as usual. Not used with return_score or
+        when max_player is not the player to move
+    pvs: boolean
+        principal variation search: at each node, only the first child is
+        searched with the full window; the others are searched with a null
+        window around the best value so far, which only tells whether they
+        do better, and searched again with the full window when they do
+    stats: utils.stats.SearchStats or None
+        counters to add the work done by the search to: nodes per ply, leaf
+        evaluations, terminal positions, successors generated, and the time
+        spent on each
 
+    return_score: boolean
+        return (score, placement) instead of placement alone
 
     Returns
     -------
@@ -285,53 +528,200 @@ def alphabeta(player, board, depth_limit):
         (counted from the most left as 0)
         None to give up the game
     """
-    max_player = player
+    if max_player is None:
+        max_player = player
     placement = None
 
 
-    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    next_player = board.PLAYER2 if max_player == board.PLAYER1 else board.PLAYER1
     score = -math.inf
 ### Please finish the code below ##############################################
 ###############################################################################
+    # one search for stats, whether the solver answers or the depth-limited
+    # search below takes over from it
+    if stats is not None:
+        started = stats.start()
+    if solver is not None and player == max_player and not return_score and \
+       not board.terminal() and solver.applies(board):
+        if stats is not None:
+            nodes = solver.nodes
+        fallback = False
+        try:
+            return solver.solve(player, board, deadline, stop)[1]
+        except SearchTimeout:
+            fallback = True
+        finally:
+            if stats is not None:
+                stats.nodes += solver.nodes - nodes
+                if not fallback:
+                    stats.finish(started)
+
+    root_depth = depth_limit
+    cols = board.cols
+    if tt is not None:
+        side, sign = _tt_context(max_player, board)
+    if ordering is not None:
+        ordering.start()
+
+    def children_order(player, depth_limit, hint):
+        if ordering is not None:
+            return ordering.order(player, cols, root_depth-depth_limit, hint)
+        if hint is not None and depth_limit == root_depth:
+            return [hint] + [c for c in range(cols) if c != hint]
+        return None
+
+    def cutoff(player, action, depth_limit, index):
+        if stats is not None:
+            stats.cutoff(index)
+        if ordering is not None:
+            ordering.cutoff(player, action, root_depth-depth_limit, depth_limit)
+
     def value(player, board, depth_limit, alpha, beta):
-        if depth_limit == 0 or board.terminal():
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout()
+        if stop is not None and stop.is_set():
+            raise SearchCancelled()
+        if stats is not None:
+            stats.node(root_depth-depth_limit)
+            if stats.leaf(board, depth_limit):
+                return [stats.evaluate(evaluate, max_player, board), None]
+        elif depth_limit == 0 or board.terminal():
             return [evaluate(max_player, board), None]
+        hint = first if depth_limit == root_depth else None
+        if tt is not None:
+            key = board.canonical_key() ^ side[player]
+            entry = tt.probe(key) if depth_limit < root_depth else None
+            if entry is not None:
+                hint = board.canonical_col(entry[4])
+            if entry is not None and entry[1] == depth_limit:
+                v, flag = sign*entry[3], _tt_flag(entry[2], sign)
+                if flag == EXACT or (flag == LOWER and v >= beta) or \
+                   (flag == UPPER and v <= alpha):
+                    return [v, hint]
         if player == max_player:                      
-            return max_value(player, board, depth_limit, alpha, beta)
+            res = max_value(player, board, depth_limit, alpha, beta, hint)
         else:
-            return min_value(player, board, depth_limit, alpha, beta)  
-
+            res = min_value(player, board, depth_limit, alpha, beta, hint)  
+        if tt is not None:
+            v = res[0]
+            flag = UPPER if v <= alpha else LOWER if v >= beta else EXACT
+            tt.store(key, depth_limit, _tt_flag(flag, sign), sign*v, board.canonical_col(res[1]))
+        return res
 
-    def max_value(player, board, depth_limit, alpha, beta):
+    # A child only replaces the current action when it is strictly better:
+    # a child searched with alpha = v that returns exactly v may only be an
+    # upper bound, so taking it on a tie could pick a worse move.
+    def max_value(player, board, depth_limit, alpha, beta, hint=None):
         v = -math.inf
-        for child in get_child_boards(player, board):
-            next_value = value(next_player, child[1], depth_limit-1, alpha, beta)[0]
-            if v <= next_value:
+        action = None
+        order = children_order(player, depth_limit, hint)
+        for i, child in enumerate(_children(player, board, inplace, order, stats)):
+            try:
+                if pvs and i > 0:
+                    # scores are integers: (alpha, alpha+1) only tells
+                    # whether the child beats alpha
+                    next_value = value(next_player, child[1], depth_limit-1, alpha, alpha+1)[0]
+                    if alpha < next_value < beta:
+                        next_value = value(next_player, child[1], depth_limit-1, alpha, beta)[0]
+                else:
+                    next_value = value(next_player, child[1], depth_limit-1, alpha, beta)[0]
+            finally:
+                if inplace:
+                    board.undo()
+            if action is None or v < next_value:
                 v = next_value
                 action = child[0]
             if v >= beta:
+                cutoff(player, action, depth_limit, i)
                 return [v, action]
             alpha = max(alpha, v)
         return [v, action]
     
-    def min_value(player, board, depth_limit, alpha, beta):
+    def min_value(player, board, depth_limit, alpha, beta, hint=None):
         v = math.inf
-        for child in get_child_boards(player, board):
-            next_value = value(max_player, child[1], depth_limit-1, alpha, beta)[0]
-            if v >= next_value:
+        action = None
+        order = children_order(player, depth_limit, hint)
+        for i, child in enumerate(_children(player, board, inplace, order, stats)):
+            try:
+                if pvs and i > 0:
+                    next_value = value(max_player, child[1], depth_limit-1, beta-1, beta)[0]
+                    if alpha < next_value < beta:
+                        next_value = value(max_player, child[1], depth_limit-1, alpha, beta)[0]
+                else:
+                    next_value = value(max_player, child[1], depth_limit-1, alpha, beta)[0]
+            finally:
+                if inplace:
+                    board.undo()
+            if action is None or v > next_value:
                 v = next_value
                 action = child[0]
             if v <= alpha:
+                cutoff(player, action, depth_limit, i)
                 return [v, action]
-            beta = max(beta, v)
+            beta = min(beta, v)
         return [v, action]
 
-    score, placement = value(player, board, depth_limit, -math.inf, math.inf)
+    try:
+        score, placement = value(player, board, depth_limit, alpha, beta)
+    finally:
+        if stats is not None:
+            stats.finish(started)
 ###############################################################################
+    if return_score:
+        return score, placement
+    return placement
+
+
+def mtdf(player, board, depth_limit, guess=0, tt=None, return_score=False, **kwargs):
+    """
+    MTD(f): the score of the position found by a sequence of null-window
+    alpha-beta searches only, each one telling whether the score is above
+    or below a test value and moving the test value to the bound found,
+    until the two bounds meet. Each pass reuses the positions stored by the
+    previous ones, so a transposition table is needed to make it pay off;
+    a fresh one is used when tt is None.
+
+    Parameters
+    ----------
+    player, board, depth_limit:
+        as for alphabeta, with player being the max player
+    guess: float
+        first test value, such as the score of a shallower search; the
+        closer to the score, the fewer passes
+    tt: utils.transposition.TranspositionTable or None
+        table shared by the passes
+    kwargs:
+        other options passed to alphabeta, e.g. ordering or stats
+
+    Returns
+    -------
+    placement: int or None
+        the column in which a disc should be placed for the specific player,
+        or (score, placement) with return_score
+    """
+    if tt is None:
+        tt = TranspositionTable(16)
+    lower, upper = -math.inf, math.inf
+    score, placement = guess, None
+    while lower < upper:
+        beta = max(score, lower+1)
+        score, move = alphabeta(player, board, depth_limit, tt=tt, alpha=beta-1, beta=beta,
+            return_score=True, **kwargs
+        )
+        if score < beta:
+            upper = score
+        else:
+            # the move is at least as good as score, the best one so far
+            lower = score
+            placement = move
+    if return_score:
+        return score, placement
     return placement
 
 
-def expectimax(player, board, depth_limit):
+def expectimax(player, board, depth_limit, inplace=True, deadline=None,
+               batch=False, max_player=None, return_score=False, stop=None, stats=None,
+               prune=False):
     """
     Expectimax algorithm.
     We assume that the adversary of the initial player chooses actions
@@ -347,7 +737,37 @@ def expectimax(player, board, depth_limit):
     board: the current game board instance
     depth_limit: int
         the tree depth that the search algorithm needs to go before stopping
-    max_player: boolean
+    max_player: board.PLAYER1 or board.PLAYER2 or None
+        the player the search evaluates the game for; the player to move by
+        default. When it is the other player, the root is searched as a
+        MIN (or CHANCE) node, e.g. to score one root move on its own
+    inplace: boolean
+        walk the tree by placing and undoing discs on the given board instead
+        of cloning it at every node; False keeps the clone-based reference path
+    deadline: float or None
+        time.perf_counter() value after which the search gives up by raising
+        SearchTimeout; the board is restored before the exception propagates
+    stop: threading.Event or None
+        the search gives up by raising SearchCancelled once it is set, e.g.
+        from another thread when the game the search is for is abandoned
+    stats: utils.stats.SearchStats or None
+        counters to add the work done by the search to: nodes per ply, leaf
+        evaluations, terminal positions, successors generated, and the time
+        spent on each
+    batch: boolean
+        expand the last two plies of the tree as arrays and evaluate all the
+        leaves under a node with utils.vectorized.evaluate_batch in one call;
+        requires numpy and gives the same result as evaluate() leaf by leaf.
+        Only pays off with boards that evaluate by scanning their windows,
+        such as utils.app.Board: on utils.bitboard.ScoredBitBoard, whose
+        evaluation is kept up to date move by move, it is slower
+    prune: boolean
+        cut off chance nodes whose average can no longer matter (Star1),
+        using that evaluate() is bounded by the weight of k discs in every
+        window; gives the same placement as the full search
+
+    return_score: boolean
+        return (score, placement) instead of placement alone
 
     Returns
     -------
@@ -356,55 +776,273 @@ def expectimax(player, board, depth_limit):
         (counted from the most left as 0)
         None to give up the game
     """
-    max_player = player
+    if max_player is None:
+        max_player = player
     placement = None
 
-    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    next_player = board.PLAYER2 if max_player == board.PLAYER1 else board.PLAYER1
     score = -math.inf
 ### Please finish the code below ##############################################
 ###############################################################################
-    def value(player, board, depth_limit):
-        if depth_limit == 0 or board.terminal():
+    root_depth = depth_limit
+    if prune:
+        bound = score_bound(board.rows, board.cols, getattr(board, "k", 4))
+
+    def value(player, board, depth_limit, alpha=-math.inf, beta=math.inf):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout()
+        if stop is not None and stop.is_set():
+            raise SearchCancelled()
+        if stats is not None:
+            stats.node(root_depth-depth_limit)
+            if stats.leaf(board, depth_limit):
+                return [stats.evaluate(evaluate, max_player, board), None]
+        elif depth_limit == 0 or board.terminal():
             return [evaluate(max_player, board), None]
         if player == max_player:                      
-            return max_value(player,board,depth_limit)
+            return max_value(player,board,depth_limit,alpha,beta)
         else:
-            return exp_value(player,board,depth_limit)
+            return exp_value(player,board,depth_limit,alpha,beta)
 
-    def max_value(player, board, depth_limit):
+    def chance_value(leaf, scores):
+        # the value of a chance node at depth 1 from the evaluations of its
+        # children, or of itself when it ends the game
+        if leaf:
+            return scores[0]
+        probability = 1/len(scores)
+        return sum(probability * s for s in scores)
+
+    def max_value(player, board, depth_limit, alpha, beta):
         v = -math.inf
-        for child in get_child_boards(player, board):
-            next_value = value(next_player, child[1], depth_limit-1)[0]
-            if v <= next_value:
+        if batch and depth_limit == 2:
+            for col, leaf, scores in _last_two_plies(player, next_player, max_player, board, stats, root_depth-depth_limit):
+                next_value = chance_value(leaf, scores)
+                if v <= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        if batch and depth_limit == 1:
+            for col, next_value in _last_ply(player, max_player, board, stats, root_depth-depth_limit):
+                if v <= next_value:
+                    v = next_value
+                    action = col
+            return [v, action]
+        order = None
+        if prune and depth_limit == root_depth:
+            # children with the best evaluation first, so that the others
+            # are cut off against a high alpha
+            order = sorted(
+                (c for c in range(board.cols) if board.placeable(c)),
+                key=lambda c: -_evaluate_child(player, c, board)
+            )
+        for i, child in enumerate(_children(player, board, inplace, order, stats)):
+            try:
+                if prune:
+                    # at the root, a child tying with the best one so far must
+                    # still get its exact value to break the tie as below
+                    a = v-1 if depth_limit == root_depth else v
+                    next_value = value(next_player, child[1], depth_limit-1, max(alpha, a), beta)[0]
+                else:
+                    next_value = value(next_player, child[1], depth_limit-1)[0]
+            finally:
+                if inplace:
+                    board.undo()
+            # on ties the rightmost child, the last one left to right
+            if v < next_value or (v == next_value and (order is None or child[0] > action)):
                 v = next_value
                 action = child[0]
+            if prune and v >= beta:
+                if stats is not None:
+                    stats.cutoff(i)
+                return [v, action]
         return [v, action]
     
-    def exp_value(player, board, depth_limit):
+    # With prune, chance nodes are cut off as in Star1: once the children
+    # seen so far, with the others at their extreme values, can no longer
+    # bring the average inside (alpha, beta), the node fails low (or high)
+    # and returns that bound. Values are never below -bound, and never
+    # above the evaluation of the chance node itself: below a chance node
+    # only the adversary places discs (exp_value and max_value both hand
+    # the move to next_player), and an adversary disc can only lower
+    # evaluate(max_player) as the window weights are positive and growing.
+    # The upper bound, and so the pruning, is only sound as long as MAX
+    # never moves again below a chance node; a search where it does must
+    # use bound on both sides.
+    # Each child is searched with the window its value must leave for a
+    # cutoff, widened by 1 so that a child on the edge of it still gets its
+    # exact value and the cutoff is decided on the same sums as without
+    # pruning.
+    def exp_value(player, board, depth_limit, alpha, beta):
         v = 0
         actions = []
-        probability = 1/(len(get_child_boards(player, board)))
-        for child in get_child_boards(player, board):
-            v += probability * value(next_player, child[1], depth_limit-1)[0]
+        if prune:
+            top = evaluate(max_player, board)
+            if top <= alpha:
+                if stats is not None:
+                    stats.cutoff(0)
+                return [top, None]
+        n = count_child_boards(board)
+        probability = 1/n
+        if batch and depth_limit == 2:
+            for col, leaf, scores in _last_two_plies(player, next_player, max_player, board, stats, root_depth-depth_limit):
+                v += probability * chance_value(leaf, scores)
+                actions.append(col)
+            return [v, random.choice(actions)]
+        if batch and depth_limit == 1:
+            for col, next_value in _last_ply(player, max_player, board, stats, root_depth-depth_limit):
+                v += probability * next_value
+                actions.append(col)
+            return [v, random.choice(actions)]
+        for i, child in enumerate(_children(player, board, inplace, stats=stats)):
+            try:
+                if prune:
+                    rest_high = (n-i-1) * probability * top
+                    rest_low = (n-i-1) * probability * -bound
+                    next_value = value(next_player, child[1], depth_limit-1,
+                        (alpha - v - rest_high)/probability - 1,
+                        (beta - v - rest_low)/probability + 1
+                    )[0]
+                else:
+                    next_value = value(next_player, child[1], depth_limit-1)[0]
+            finally:
+                if inplace:
+                    board.undo()
+            v += probability * next_value
             actions.append(child[0])
+            if prune and (v + rest_high <= alpha or v + rest_low >= beta):
+                if stats is not None:
+                    stats.cutoff(i)
+                return [v + rest_high if v + rest_high <= alpha else v + rest_low, None]
         return [v, random.choice(actions)]
 
-    score, placement = value(player, board, depth_limit)
+    if stats is not None:
+        started = stats.start()
+    try:
+        score, placement = value(player, board, depth_limit)
+    finally:
+        if stats is not None:
+            stats.finish(started)
 
 ###############################################################################
+    if return_score:
+        return score, placement
     return placement
 
 
+def _deepen(search_fn, player, board, time_budget_ms, seed_first=False, **kwargs):
+    deadline = time.perf_counter() + time_budget_ms/1000
+    empty = sum(not board.occupied(r, c) for r in range(board.rows) for c in range(board.cols))
+    placement = None
+    for depth in range(1, empty+1):
+        if seed_first:
+            kwargs["first"] = placement
+        try:
+            placement = search_fn(player, board, depth, deadline=deadline, **kwargs)
+        except SearchTimeout:
+            break
+    if placement is None and empty:
+        # not even depth 1 fit into the budget, still give a move
+        placement = search_fn(player, board, 1, **kwargs)
+    return placement
+
+
+def alphabeta_timed(player, board, time_budget_ms, **kwargs):
+    """
+    Alpha-beta search by iterative deepening under a time budget.
+
+    The search is run at depth 1, 2, ... and each iteration starts from the
+    best move of the previous one. When the budget runs out the running
+    iteration is abandoned and the move of the deepest completed one is
+    returned.
+
+    Parameters
+    ----------
+    player: board.PLAYER1 or board.PLAYER2
+        the player that needs to take an action (place a disc in the game)
+    board: the current game board instance
+    time_budget_ms: float
+        the time the search may take, in milliseconds
+    kwargs:
+        other options passed to alphabeta, e.g. tt, which lets each
+        iteration reuse the positions searched by the previous ones
+
+    Returns
+    -------
+    placement: int or None
+        the column in which a disc should be placed for the specific player
+        (counted from the most left as 0)
+        None to give up the game
+    """
+    return _deepen(alphabeta, player, board, time_budget_ms, seed_first=True, **kwargs)
+
+
+def minimax_timed(player, board, time_budget_ms, **kwargs):
+    """
+    Minimax by iterative deepening under a time budget, see alphabeta_timed.
+    """
+    return _deepen(minimax, player, board, time_budget_ms, **kwargs)
+
+
+def expectimax_timed(player, board, time_budget_ms, **kwargs):
+    """
+    Expectimax by iterative deepening under a time budget, see alphabeta_timed.
+    """
+    return _deepen(expectimax, player, board, time_budget_ms, **kwargs)
+
+
 if __name__ == "__main__":
     from utils.app import App
-    import tkinter
+    from utils.bitboard import ScoredBitBoard
+    from utils.transposition import TranspositionTable
+    from utils.ordering import MoveOrdering
+    from utils.book import OpeningBook
+    from utils.solver import Solver
+    from utils.engine import EngineClient
+    from functools import partial
+    import argparse, os, tkinter
+
+    parser = argparse.ArgumentParser(description="Play Connect-4, or Connect-K on any board.")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--k", type=int, default=4, help="discs in a row needed to win")
+    args = parser.parse_args()
 
+    # one table for the whole session: entries are stored from PLAYER1's
+    # point of view and keyed by the side to move, so both agents share it
+    tt = TranspositionTable(64)
+    ordering = MoveOrdering()
+    solver = Solver()
     algs = {
-        "Minimax": minimax,
-        "Alpha-beta pruning": alphabeta,
-        "Expectimax": expectimax
+        "Minimax": partial(minimax, tt=tt),
+        "Alpha-beta pruning": partial(alphabeta, tt=tt, ordering=ordering, solver=solver),
+        "Expectimax": partial(expectimax, prune=True)
     }
+    timed_algs = {
+        "Minimax": partial(minimax_timed, tt=tt),
+        "Alpha-beta pruning": partial(alphabeta_timed, tt=tt, ordering=ordering, solver=solver),
+        "Expectimax": partial(expectimax_timed, prune=True)
+    }
+
+    # serve the first moves of alpha-beta from the opening book if one was
+    # built next to this file (python -m utils.book book.bin)
+    book_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+    if os.path.exists(book_path):
+        book = OpeningBook(book_path)
+        for fn_map in (algs, timed_algs):
+            fn_map["Alpha-beta pruning"] = book.wrap(fn_map["Alpha-beta pruning"])
+
+    # the "Engine" agent: an alpha-beta engine process that keeps its
+    # caches warm over the whole session (python -m utils.engine), started
+    # by the App when the agent first plays
+    engine_factory = partial(EngineClient, rows=args.rows, cols=args.cols, k=args.k,
+        book=book_path if os.path.exists(book_path) else None
+    )
 
     root = tkinter.Tk()
-    App(algs, root)
-    root.mainloop()
+    app = App(algs, root, board_cls=ScoredBitBoard, timed_fn_map=timed_algs,
+        rows=args.rows, cols=args.cols, k=args.k, engine_factory=engine_factory
+    )
+    try:
+        root.mainloop()
+    finally:
+        app.close()
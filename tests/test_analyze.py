@@ -0,0 +1,23 @@
+# test_analyze.py
+# ---------
+# Input checks of utils.analyze.
+#
+
+import pytest
+
+import connect4
+from utils.analyze import analyze_position, load_position, main
+
+
+def test_errors_number_columns_from_1():
+    with pytest.raises(ValueError, match=r"Move 7 \(4\)"):
+        load_position("4444444")
+
+
+@pytest.mark.parametrize("depth", [0, -1])
+def test_depth_below_1_is_rejected(depth):
+    player, board = load_position("44")
+    with pytest.raises(ValueError):
+        analyze_position(player, board, connect4.minimax, depth)
+    with pytest.raises(SystemExit):
+        main(["--depth", str(depth)])
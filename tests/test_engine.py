@@ -0,0 +1,34 @@
+# test_engine.py
+# ---------
+# The command protocol of utils.engine.Engine, driven in-process.
+#
+
+import io
+
+from utils.engine import Engine
+
+
+def run(*lines):
+    out = io.StringIO()
+    engine = Engine(out, tt_size_mb=1, solver=0)
+    for line in lines:
+        engine.handle(line)
+        engine.stop()
+    return [l for l in out.getvalue().splitlines() if not l.startswith("info depth")]
+
+
+def test_go_answers_the_position_sent():
+    assert run("position 44", "go depth 2")[-1].startswith("bestmove ")
+    assert run("position 44", "go depth 2")[-1] != "bestmove none"
+
+
+def test_no_move_after_a_rejected_position():
+    for bad in ("position 4444444", "position 4x", "position 9"):
+        lines = run("position 44", bad, "go depth 2")
+        assert lines[0].startswith("info string error")
+        assert lines[-2:] == ["info string error no valid position", "bestmove none"]
+
+
+def test_newgame_or_position_clears_the_error():
+    assert run("position 4444444", "newgame", "go depth 1")[-1] != "bestmove none"
+    assert run("position 4444444", "position 4453", "go depth 1")[-1] != "bestmove none"
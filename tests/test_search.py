@@ -0,0 +1,224 @@
+# test_search.py
+# ---------
+# Checks that the faster search paths of connect4.py find what the plain
+# searches find, on random positions. Run `python -m pytest` from the
+# project folder.
+#
+
+import random
+
+import pytest
+
+import connect4
+from utils.app import Board
+from utils.bitboard import BitBoard, ScoredBitBoard
+from utils.solver import Solver
+from utils.transposition import TranspositionTable
+
+BOARDS = [Board, BitBoard, ScoredBitBoard]
+
+
+def random_position(board_cls, rng, plies, rows=6, cols=7, k=4):
+    """(player to move, board) after up to plies random moves, not terminal."""
+    while True:
+        board = board_cls(rows, cols, k)
+        player = board.PLAYER1
+        for _ in range(plies):
+            board.place(player, rng.choice([c for c in range(cols) if board.placeable(c)]))
+            player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+            if board.terminal():
+                break
+        if not board.terminal():
+            return player, board
+
+
+def positions(board_cls, n, min_plies=0, max_plies=30, seed=0):
+    rng = random.Random(seed)
+    return [random_position(board_cls, rng, rng.randint(min_plies, max_plies)) for _ in range(n)]
+
+
+def replay(board_cls, board, rows=6, cols=7, k=4):
+    """The moves of board played on a new board_cls board."""
+    res = board_cls(rows, cols, k)
+    player = res.PLAYER1
+    for c in board.moves():
+        res.place(player, c)
+        player = res.PLAYER2 if player == res.PLAYER1 else res.PLAYER1
+    return res
+
+
+def mirror(board):
+    """The mirror image of board, played from the empty board."""
+    res = type(board)(board.rows, board.cols, board.k)
+    player = res.PLAYER1
+    for c in board.moves():
+        res.place(player, board.cols-1-c)
+        player = res.PLAYER2 if player == res.PLAYER1 else res.PLAYER1
+    return res
+
+
+def brute_force(player, board, memo):
+    # exact score of board for player by a full search, with the scores of
+    # utils.solver: 0 for a draw, (moves left for the winner)+1 for a win
+    key = (board.zobrist(), player)
+    if key in memo:
+        return memo[key]
+    adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    size = board.rows*board.cols
+    moves = len(board.moves())
+    best = None
+    for c in range(board.cols):
+        if board.placeable(c):
+            board.place(player, c)
+            if board.who_wins() == player:
+                s = (size + 1 - moves)//2
+            elif moves + 1 == size:
+                s = 0
+            else:
+                s = -brute_force(adversary, board, memo)
+            board.undo()
+            if best is None or s > best:
+                best = s
+    memo[key] = best
+    return best
+
+
+@pytest.mark.parametrize("board_cls", [BitBoard, ScoredBitBoard])
+def test_evaluate_is_the_same_on_every_board(board_cls):
+    for k in (3, 4, 5):
+        rng = random.Random(k)
+        for _ in range(30):
+            player, board = random_position(Board, rng, rng.randint(0, 30), k=k)
+            other = replay(board_cls, board, k=k)
+            for p in (board.PLAYER1, board.PLAYER2):
+                assert connect4.evaluate(p, other) == connect4.evaluate(p, board)
+
+
+def test_mirror_images_share_their_key():
+    for player, board in positions(ScoredBitBoard, 50, seed=2):
+        image = mirror(board)
+        assert image.canonical_key() == board.canonical_key()
+        if image.zobrist() == board.zobrist():
+            # a symmetric position is its own mirror image
+            continue
+        for c in range(board.cols):
+            assert image.canonical_col(board.cols-1-c) == board.canonical_col(c)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3, 4])
+def test_mirror_images_search_to_mirrored_scores(depth):
+    for player, board in positions(ScoredBitBoard, 10, seed=depth):
+        score = connect4.alphabeta(player, board, depth, return_score=True)[0]
+        assert connect4.alphabeta(player, mirror(board), depth, return_score=True)[0] == score
+
+
+@pytest.mark.parametrize("fn", [connect4.minimax, connect4.alphabeta])
+def test_transposition_table_gives_the_same_move(fn):
+    shared = TranspositionTable(4)
+    for depth in (1, 2, 3, 4):
+        for player, board in positions(ScoredBitBoard, 10, seed=depth):
+            plain = fn(player, board, depth, return_score=True)
+            assert fn(player, board, depth, tt=TranspositionTable(1), return_score=True) == plain
+            assert fn(player, board, depth, tt=shared, return_score=True) == plain
+
+
+def test_evaluate_batch_matches_evaluate():
+    np = pytest.importorskip("numpy")
+    from utils.vectorized import board_array, evaluate_batch
+    for rows, cols, k in ((6, 7, 4), (5, 5, 3), (8, 9, 5)):
+        rng = random.Random(rows)
+        boards = [random_position(Board, rng, rng.randint(0, rows*cols//2), rows, cols, k)[1]
+            for _ in range(20)]
+        stack = np.stack([board_array(b) for b in boards])
+        for p in (1, 2):
+            assert evaluate_batch(p, stack, k).tolist() == [connect4.evaluate(p, b) for b in boards]
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+@pytest.mark.parametrize("fn", [connect4.minimax, connect4.expectimax])
+def test_batch_matches_the_scalar_search(board_cls, fn):
+    pytest.importorskip("numpy")
+    for depth in (1, 2, 3):
+        for player, board in positions(board_cls, 6, seed=depth):
+            assert fn(player, board, depth, batch=True, return_score=True) == \
+                fn(player, board, depth, return_score=True)
+
+
+def test_solver_is_exact():
+    rng = random.Random(4)
+    solver = Solver()
+    for _ in range(25):
+        player, board = random_position(BitBoard, rng, rng.randint(32, 36))
+        exact = brute_force(player, board, {})
+        score, col = solver.solve(player, board)
+        assert score == exact
+        # and its move reaches that score
+        board.place(player, col)
+        adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        size, moves = board.rows*board.cols, len(board.moves())
+        if board.who_wins() == player:
+            after = (size + 2 - moves)//2
+        elif moves == size:
+            after = 0
+        else:
+            after = -brute_force(adversary, board, {})
+        board.undo()
+        assert after == exact
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+def test_adversary_disc_never_raises_evaluate(board_cls):
+    # expectimax(prune=True) bounds a chance node by its own evaluation,
+    # which only holds if a disc of the adversary never raises it
+    for player, board in positions(board_cls, 40):
+        adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        top = connect4.evaluate(player, board)
+        for c in range(board.cols):
+            if board.placeable(c):
+                board.place(adversary, c)
+                assert connect4.evaluate(player, board) <= top
+                board.undo()
+
+
+def test_expectimax_keeps_the_adversary_below_chance_nodes():
+    # the same bound needs chance nodes to chain down to the leaves: a
+    # search must never place a disc of MAX below the root
+    placed = []
+
+    class Recording(ScoredBitBoard):
+        def place(self, player, col):
+            placed.append((len(self.moves()), player))
+            super().place(player, col)
+
+    for player, board in positions(ScoredBitBoard, 5, max_plies=20, seed=1):
+        rec = Recording(board.rows, board.cols)
+        p = board.PLAYER1
+        for c in board.moves():
+            rec.place(p, c)
+            p = board.PLAYER2 if p == board.PLAYER1 else board.PLAYER1
+        start = len(rec.moves())
+        del placed[:]
+        connect4.expectimax(player, rec, 3)
+        assert all(p != player for ply, p in placed if ply > start)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3, 4])
+def test_expectimax_prune_matches_full_search(depth):
+    for player, board in positions(ScoredBitBoard, 15, seed=depth):
+        full = connect4.expectimax(player, board, depth, return_score=True)
+        pruned = connect4.expectimax(player, board, depth, prune=True, return_score=True)
+        assert pruned == full
+
+
+def test_solver_fallback_counts_one_search():
+    from utils.solver import Solver
+    from utils.stats import SearchStats
+    board = ScoredBitBoard(6, 7)
+    board.place(board.PLAYER1, 3)
+    board.place(board.PLAYER2, 3)
+    # the whole board for the solver, with no time to solve it
+    solver = Solver(threshold=42, time_cap_ms=1)
+    stats = SearchStats()
+    connect4.alphabeta(board.PLAYER1, board, 2, solver=solver, stats=stats)
+    assert solver.nodes > 0
+    assert stats.searches == 1
@@ -0,0 +1,218 @@
+# analyze.py
+# ---------
+# Offline analysis of stored positions: the score of every column and the
+# best move, for many positions at once, on a pool of worker processes.
+#
+# Usage, from the project folder:
+#   python -m utils.analyze positions.txt --depth 6 > analysis.jsonl
+#   cat games.txt | python -m utils.analyze --movetime 500 --workers 4
+#
+# Each input line is a move string (see utils.notation, e.g. "4453") or a
+# board as printed by Board.dump(): all of its rows on one line, or one row
+# per line. Empty lines and lines starting with "#" are skipped. For every
+# position, one JSON line is written in input order with the player to
+# move, the score of each column for that player (null for full columns),
+# the best column (0-based, the leftmost on ties), and the depth searched;
+# or an "error" for input that is not a position. Move strings only go up
+# to column 9, so positions of wider boards (--cols) are given as dumps.
+#
+# Input is read as the workers get through it, with a bounded number of
+# positions in flight, so memory stays flat however long it is.
+#
+
+import json, os, re, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .bitboard import ScoredBitBoard
+from .errors import SearchTimeout
+from .notation import parse_dump, parse_moves, play_moves, set_position
+from . import worker_state
+
+ALGORITHMS = ("minimax", "alphabeta", "expectimax")
+
+def read_positions(lines, rows=6, cols=7):
+    """
+    (line number, text) of each position in an iterable of input lines,
+    joining the rows of a board dumped over several lines.
+    """
+    pending, start = [], None
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if "[" in line:
+            if not pending:
+                start = n
+            pending.append(line)
+            if sum(len(re.findall(r"\d+", l)) for l in pending) >= rows*cols:
+                yield start, " ".join(pending)
+                pending = []
+            continue
+        if pending:
+            # a dump cut short
+            yield start, " ".join(pending)
+            pending = []
+        if line and not line.startswith("#"):
+            yield n, line
+    if pending:
+        yield start, " ".join(pending)
+
+
+def load_position(text, rows=6, cols=7, board_cls=ScoredBitBoard, k=4):
+    """(player to move, board) of a move string or a Board.dump() text."""
+    board = board_cls(rows, cols, k)
+    if "[" in text:
+        player = set_position(board, parse_dump(text, rows, cols))
+    else:
+        moves = parse_moves(text)
+        if any(c >= cols for c in moves):
+            raise ValueError("Columns go up to {}: {!r}".format(cols, text))
+        player = play_moves(board, moves)
+    return player, board
+
+
+def analyze_position(player, board, search_fn, depth=None, movetime_ms=None, **kwargs):
+    """
+    Score every column of board for player with search_fn (connect4.minimax,
+    alphabeta or expectimax): the score of a column is that of a search one
+    ply shallower from the position after it, at the given depth or, with
+    movetime_ms, at the deepest depth completed for all the columns within
+    that time.
+
+    Returns
+    -------
+    scores: list of float or None
+        the score of each column for player, None for full columns
+    best: int or None
+        the column with the highest score, the leftmost on ties
+    depth: int
+        the depth the scores come from, 0 if none could be computed
+
+    Raises ValueError if depth is used and is less than 1.
+    """
+    if movetime_ms is None and depth < 1:
+        raise ValueError("The depth must be at least 1, got {}.".format(depth))
+    adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    empty = sum(not board.occupied(r, c) for r in range(board.rows) for c in range(board.cols))
+    deadline = None
+    if movetime_ms is not None:
+        deadline = time.perf_counter() + movetime_ms/1000
+        depths = range(1, empty+1)
+    else:
+        depths = [depth]
+    scores, reached = [None]*board.cols, 0
+    for d in depths:
+        res = [None]*board.cols
+        try:
+            for c in range(board.cols):
+                if board.placeable(c):
+                    board.place(player, c)
+                    try:
+                        res[c] = search_fn(adversary, board, d-1, max_player=player,
+                            return_score=True, deadline=deadline, **kwargs
+                        )[0]
+                    finally:
+                        board.undo()
+        except SearchTimeout:
+            break
+        scores, reached = res, d
+    best = None
+    for c, s in enumerate(scores):
+        if s is not None and (best is None or s > scores[best]):
+            best = c
+    return scores, best, reached
+
+
+def _analyze(n, text, rows, cols, k, algorithm, depth, movetime_ms):
+    import connect4
+    record = {"line": n, "input": text}
+    try:
+        player, board = load_position(text, rows, cols, k=k)
+    except (ValueError, IndexError) as e:
+        record["error"] = str(e)
+        return record
+    record["player"] = player
+    if board.terminal():
+        winner = board.who_wins()
+        record["result"] = "draw" if winner is None else \
+            "player1" if winner == board.PLAYER1 else "player2"
+        return record
+    kwargs = {}
+    if algorithm in ("minimax", "alphabeta"):
+        kwargs["tt"] = worker_state.tt
+    if algorithm == "alphabeta":
+        kwargs["ordering"] = worker_state.ordering
+    if algorithm == "expectimax":
+        kwargs["prune"] = True
+    t = time.perf_counter()
+    scores, best, reached = analyze_position(player, board, getattr(connect4, algorithm),
+        depth, movetime_ms, **kwargs
+    )
+    record["scores"] = scores
+    record["best"] = best
+    record["depth"] = reached
+    record["time"] = round(time.perf_counter() - t, 6)
+    return record
+
+
+def analyze_stream(lines, algorithm="alphabeta", depth=4, movetime_ms=None,
+                   rows=6, cols=7, workers=None, tt_size_mb=16, in_flight=None, k=4):
+    """
+    Analyze the positions in an iterable of input lines on a pool of worker
+    processes and yield their records in input order. At most in_flight
+    positions (4 per worker by default) are read ahead of the one being
+    yielded.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Unknown algorithm {}".format(algorithm))
+    if movetime_ms is None and depth < 1:
+        raise ValueError("The depth must be at least 1, got {}.".format(depth))
+    if in_flight is None:
+        in_flight = 4*(workers or os.cpu_count())
+    with ProcessPoolExecutor(workers, initializer=worker_state.init_worker, initargs=(tt_size_mb,)) as pool:
+        pending = deque()
+        for n, text in read_positions(lines, rows, cols):
+            pending.append(pool.submit(_analyze, n, text, rows, cols, k, algorithm, depth, movetime_ms))
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    import argparse
+
+    def depth(text):
+        d = int(text)
+        if d < 1:
+            raise argparse.ArgumentTypeError("the depth must be at least 1")
+        return d
+
+    parser = argparse.ArgumentParser(description="Score Connect-4 positions in bulk.")
+    parser.add_argument("input", nargs="?", help="file of positions, stdin by default")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument("--depth", type=depth, default=4, help="search depth from each position")
+    limit.add_argument("--movetime", type=float, help="time budget per position in ms, instead of a depth")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="alphabeta")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--k", type=int, default=4, help="discs in a row needed to win")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, the number of CPUs by default")
+    parser.add_argument("--out", help="JSONL file to write, stdout by default")
+    args = parser.parse_args(argv)
+
+    src = open(args.input) if args.input else sys.stdin
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        for record in analyze_stream(src, args.algorithm, args.depth, args.movetime,
+                args.rows, args.cols, args.workers, k=args.k):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if args.input:
+            src.close()
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
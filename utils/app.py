@@ -8,9 +8,12 @@
 # Authors: Pei Xu (peix@g.clemson.edu) 
 #
 
-import random, time
+import random, threading, queue
 import tkinter as tk
 from .utils import ordinal
+from .errors import SearchCancelled
+from .stats import SearchStats
+from .transposition import zobrist_keys
 
 class Board(object):
 
@@ -18,15 +21,26 @@ class Board(object):
     PLAYER1 = 1
     PLAYER2 = 2
 
-    def __init__(self, rows, cols):
-        self._board = [
-            [self.EMPTY_SLOT]*cols for _ in range(rows)
-        ]
+    __slots__ = (
+        "rows", "cols", "k", "_cells", "_heights", "_history", "_winner", "_win_ply",
+        "_keys", "_hash", "_mirror_hash"
+    )
+
+    def __init__(self, rows, cols, k=4):
         self.rows = rows
         self.cols = cols
+        self.k = k              # discs in a row needed to win
+        self._cells = bytearray(rows*cols)  # slot (r, c) at r*cols + c, row 0 on top
+        self._heights = bytearray(cols)     # number of discs in each column
+        self._history = []      # column of every disc placed, in order
+        self._winner = None     # set by the first move that connects k
+        self._win_ply = None    # len(self._history) when the winner was set
+        self._keys = zobrist_keys(rows, cols)
+        self._hash = 0          # Zobrist hash of the disc placement
+        self._mirror_hash = 0   # the same for the left-right mirror image
     
     def __getitem__(self, key):
-        return self._board[key[0]][key[1]]
+        return self._cells[key[0]*self.cols + key[1]]
     
     def get(self, row, col=None):
         return self.__getitem__(row if col is None else (row, col))
@@ -35,61 +49,116 @@ class Board(object):
         return self.__getitem__(row if col is None else (row, col)) != self.EMPTY_SLOT
     
     def placeable(self, col):
-        return self._board[0][col] == self.EMPTY_SLOT
+        return self._heights[col] < self.rows
 
     def place(self, player, col):
         assert(player == self.PLAYER1 or player == self.PLAYER2)
-        for r in reversed(self._board):
-            if r[col] == self.EMPTY_SLOT:
-                r[col] = player
-                return True
+        h = self._heights[col]
+        if h < self.rows:
+            i = (self.rows-1-h)*self.cols + col
+            self._cells[i] = player
+            self._heights[col] = h + 1
+            self._history.append(col)
+            self._hash ^= self._keys[player][i]
+            self._mirror_hash ^= self._keys[player][i + self.cols-1-2*col]
+            if self._winner is None and self._connects(i, player):
+                self._winner = player
+                self._win_ply = len(self._history)
+            return True
         raise ValueError("Column {} is not placeable.".format(col))
 
+    def undo(self):
+        if not self._history:
+            raise ValueError("No disc to undo.")
+        if self._win_ply == len(self._history):
+            self._winner = None
+            self._win_ply = None
+        col = self._history.pop()
+        h = self._heights[col] - 1
+        i = (self.rows-1-h)*self.cols + col
+        player = self._cells[i]
+        self._hash ^= self._keys[player][i]
+        self._mirror_hash ^= self._keys[player][i + self.cols-1-2*col]
+        self._cells[i] = self.EMPTY_SLOT
+        self._heights[col] = h
+        return col
+
+    def _connects(self, i, player):
+        # only the four lines through the given slot need to be checked
+        cells, cols = self._cells, self.cols
+        row, col = divmod(i, cols)
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            n = 1
+            for sign in (1, -1):
+                r, c = row + sign*dr, col + sign*dc
+                while 0 <= r < self.rows and 0 <= c < cols and \
+                      cells[r*cols + c] == player:
+                    n += 1
+                    r += sign*dr
+                    c += sign*dc
+            if n >= self.k:
+                return True
+        return False
+
+    def last_move(self):
+        if not self._history:
+            return None
+        col = self._history[-1]
+        return (self.rows - self._heights[col], col)
+
+    def moves(self):
+        return self._history[:]
+
+    def zobrist(self):
+        return self._hash
+
+    def canonical_key(self):
+        # the same for the position and its mirror image, which have the
+        # same value with mirrored moves
+        return min(self._hash, self._mirror_hash)
+
+    def mirrored(self):
+        # whether canonical_key() is the hash of the mirror image
+        return self._mirror_hash < self._hash
+
+    def canonical_col(self, col):
+        # maps a column of the board to the same column of the canonical
+        # position, and back, as the mirror is its own inverse
+        return self.cols-1-col if self._mirror_hash < self._hash else col
+
     def has_draw(self):
-        for r in self._board:
-            for c in r:
-                if c == self.EMPTY_SLOT:
-                    return False
-        return True
+        return len(self._history) == self.rows*self.cols
     
     def who_wins(self):
-        rows = list(map(lambda r: "".join(map(str, r)), self._board))
-        cols = list(map(lambda c: "".join(map(str, c)), zip(*self._board)))
-        left_revolved = [
-            [self.EMPTY_SLOT]*r+self._board[r]+[self.EMPTY_SLOT]*(self.rows-1-r) for r in range(self.rows)
-        ]
-        left_diag = list(map(lambda d: "".join(map(str, d)), zip(*left_revolved)))
-        right_revolved = [
-            [self.EMPTY_SLOT]*(self.rows-1-r)+self._board[r]+[self.EMPTY_SLOT]*r for r in range(self.rows)
-        ]
-        right_diag = list(map(lambda d: "".join(map(str, d)), zip(*right_revolved)))
-        seg = rows + cols + left_diag + right_diag
-        p1 = "".join(map(str, [self.PLAYER1]*4))
-        for s in seg:
-            if p1 in s:
-                return self.PLAYER1
-        p2 = "".join(map(str, [self.PLAYER2]*4))
-        for s in seg:
-            if p2 in s:
-                return self.PLAYER2
-        return None
+        return self._winner
 
     def terminal(self):
-        return self.has_draw() or self.who_wins() is not None
+        return self._winner is not None or self.has_draw()
     
     def clone(self):
-        b = Board(self.rows, self.cols)
-        b._board = [[c for c in r] for r in self._board]
+        b = Board.__new__(Board)
+        b.rows = self.rows
+        b.cols = self.cols
+        b.k = self.k
+        b._cells = self._cells[:]
+        b._heights = self._heights[:]
+        b._history = self._history[:]
+        b._winner = self._winner
+        b._win_ply = self._win_ply
+        b._keys = self._keys
+        b._hash = self._hash
+        b._mirror_hash = self._mirror_hash
         return b
     
     def row(self, r):
-        return [e for e in self._board[r]]
+        # a read-only view of the slots, not a copy
+        return memoryview(self._cells).toreadonly()[r*self.cols:(r+1)*self.cols]
     
     def col(self, c):
-        return [self._board[r][c] for r in range(self.rows)]
+        return memoryview(self._cells).toreadonly()[c::self.cols]
 
     def dump(self, indent=0):
-        return "\n".join([" "*indent + "{}".format(r) for r in self._board])
+        return "\n".join([" "*indent + "{}".format(self.row(r).tolist()) for r in range(self.rows)])
     
     def __str__(self):
         return self.dump()
@@ -97,15 +166,53 @@ class Board(object):
 
 class App(tk.Frame):
     
+    # the standard game, unless other sizes are given to the constructor
     BOARD_WIDTH = 7
     BOARD_HEIGHT = 6
+    BOARD_K = 4
 
     PLAYER1 = 1
     PLAYER2 = 2
 
-    def __init__(self, alg_fn_map, master=None):
+    SEARCH_DEPTHS = [str(d) for d in range(1, 10)]
+    TIME_BUDGETS = ["100 ms", "250 ms", "500 ms", "1000 ms", "2000 ms", "5000 ms"]
+
+    def __init__(self, alg_fn_map, master=None, board_cls=Board, timed_fn_map=None,
+                 rows=None, cols=None, k=None, engine_factory=None, ponder=True):
         super().__init__(master)
+        # callable returning the utils.engine.EngineClient of the "Engine"
+        # agent, if given, and taking the stop event of the search it is
+        # started for as stop=; the engine process is only started the
+        # first time the agent plays, see get_engine()
+        self.engine_factory = engine_factory
+        self.engine = None
+        self.engine_lock = threading.Lock()
+        if rows is not None:
+            self.BOARD_HEIGHT = rows
+        if cols is not None:
+            self.BOARD_WIDTH = cols
+        if k is not None:
+            self.BOARD_K = k
         self.alg_fn_map = alg_fn_map
+        # alg name -> fn(player, board, time_budget_ms), used when a player
+        # is configured by time per move instead of by search depth
+        self.timed_fn_map = timed_fn_map or {}
+        self.board_cls = board_cls
+
+        # agent moves are searched on a worker thread; a new game sets the
+        # stop event of the running search and bumps the game counter so
+        # that pending callbacks of the old game are dropped
+        self.game = 0
+        self.worker = None
+        self.stop_search = threading.Event()
+
+        # while a human thinks, an agent playing against them searches the
+        # position after each of their replies on another worker thread,
+        # see ponder()
+        self.ponder_enabled = ponder
+        self.ponder_worker = None
+        self.ponder_stop = threading.Event()
+        self.pondered = {}
 
         self.master.title("Adversarial Search -- CPSC 4420/6420 Clemson University")
 
@@ -147,12 +254,14 @@ class App(tk.Frame):
     
         player1_var = tk.StringVar(self.new_game_window)
         player2_var = tk.StringVar(self.new_game_window)
-        listbox_player1 = tk.OptionMenu(self.new_game_window, player1_var, "Agent", "Human", "Random")
-        listbox_player2 = tk.OptionMenu(self.new_game_window, player2_var, "Agent", "Human", "Random")
+        agents = ["Agent", "Human", "Random"] + (["Engine"] if self.engine_factory is not None else [])
+        listbox_player1 = tk.OptionMenu(self.new_game_window, player1_var, *agents)
+        listbox_player2 = tk.OptionMenu(self.new_game_window, player2_var, *agents)
         player1_depth_var = tk.StringVar(self.new_game_window)
         player2_depth_var = tk.StringVar(self.new_game_window)
-        listbox_player1_depth = tk.OptionMenu(self.new_game_window, player1_depth_var, "1", "2", "3", "4", "5")
-        listbox_player2_depth = tk.OptionMenu(self.new_game_window, player2_depth_var, "1", "2", "3", "4", "5")
+        limits = self.SEARCH_DEPTHS + (self.TIME_BUDGETS if self.timed_fn_map or self.engine_factory else [])
+        listbox_player1_depth = tk.OptionMenu(self.new_game_window, player1_depth_var, *limits)
+        listbox_player2_depth = tk.OptionMenu(self.new_game_window, player2_depth_var, *limits)
         player1_depth_var.set("1")
         player2_depth_var.set("1")
         player1_var.set("Agent")
@@ -162,10 +271,10 @@ class App(tk.Frame):
         listbox_player1_depth.config(state=tk.NORMAL)
         listbox_player2_depth.config(state=tk.NORMAL)
         player1_var.trace("w",
-            lambda *args: listbox_player1_depth.config(state=tk.NORMAL if player1_var.get() == "Agent" else tk.DISABLED)
+            lambda *args: listbox_player1_depth.config(state=tk.NORMAL if player1_var.get() in ("Agent", "Engine") else tk.DISABLED)
         )
         player2_var.trace("w",
-            lambda *args: listbox_player2_depth.config(state=tk.NORMAL if player2_var.get() == "Agent" else tk.DISABLED)
+            lambda *args: listbox_player2_depth.config(state=tk.NORMAL if player2_var.get() in ("Agent", "Engine") else tk.DISABLED)
         )
 
         alg_var = tk.StringVar(self.new_game_window)
@@ -173,14 +282,16 @@ class App(tk.Frame):
         listbox_alg = tk.OptionMenu(self.new_game_window, alg_var, *self.alg_fn_map.keys())
 
         def new_game():
-            self.terminal_request = True
             # self.new_game_window.destroy()
             # self.new_game_window = None
             self.new_game_window.withdraw()
+            # a search depth is kept as an int, a time budget as "<n> ms"
+            limit1 = player1_depth_var.get()
+            limit2 = player2_depth_var.get()
             self.run_game(
-                player1_var.get(), int(player1_depth_var.get()),
-                player2_var.get(), int(player2_depth_var.get()),
-                self.alg_fn_map[alg_var.get()]
+                player1_var.get(), int(limit1) if limit1.isdigit() else limit1,
+                player2_var.get(), int(limit2) if limit2.isdigit() else limit2,
+                self.alg_fn_map[alg_var.get()], self.timed_fn_map.get(alg_var.get())
             )
 
         listbox_player1.grid(row=0, column=0, padx=10)
@@ -219,12 +330,140 @@ class App(tk.Frame):
             text=msg, fill="black", font=(None, 12), anchor="center"
         )
 
+    def limit_text(self, limit):
+        if isinstance(limit, int):
+            return "Depth: {}".format(limit)
+        return "Time: {}".format(limit)
+
     def clear_canvas(self):
         self.canvas.delete("all")
 
-    def run_game(self, player1, search_depth1, player2, search_depth2, search_fn):
+    def get_engine(self, stop=None):
+        # the engine of the "Engine" agent, started on first use; called
+        # from the search thread, so that the Tk thread never waits for the
+        # process to start, and the start is abandoned with SearchCancelled
+        # once stop is set. Pondering only uses an engine already started
+        with self.engine_lock:
+            if self.engine is None:
+                self.engine = self.engine_factory(stop=stop)
+            return self.engine
+
+    def close(self):
+        # stop the searches, and the engine process if it was started
+        self.cancel_search()
+        with self.engine_lock:
+            if self.engine is not None:
+                self.engine.close()
+                self.engine = None
+
+    def cancel_search(self):
+        self.stop_search.set()
+        if self.worker is not None:
+            # the search notices the event at its next node
+            self.worker.join()
+            self.worker = None
+        self.stop_ponder()
+
+    def ponder_order(self, human):
+        # the replies of the human, the likeliest first: the best ones for
+        # the human by the board's own evaluation when it keeps one, and
+        # center-out among equals
+        board = self.board.clone()
+        cols = sorted((c for c in range(board.cols) if board.placeable(c)),
+            key=lambda c: abs(2*c - board.cols + 1)
+        )
+        if hasattr(board, "score"):
+            def gain(c):
+                board.place(human, c)
+                try:
+                    return board.score(human)
+                finally:
+                    board.undo()
+            cols.sort(key=lambda c: -gain(c))
+        return cols
+
+    def ponder(self, fn, player, limit, human):
+        # while human is to move, search with fn(player, board, limit) the
+        # position after each of their replies in turn, the likeliest
+        # first, so that player can answer a reply already searched at
+        # once; the (action, stats) found are kept by reply column until
+        # stop_ponder() is called
+        self.stop_ponder()
+        board = self.board.clone()
+        replies = self.ponder_order(human)
+        stop = threading.Event()
+        pondered = {}
+
+        def work():
+            for col in replies:
+                child = board.clone()
+                child.place(human, col)
+                if child.terminal():
+                    continue
+                stats = SearchStats(timing=True)
+                try:
+                    action = fn(player, child, limit, stop=stop, stats=stats)
+                except SearchCancelled:
+                    return
+                pondered[col] = (action, stats)
+
+        self.ponder_stop = stop
+        self.pondered = pondered
+        self.ponder_worker = threading.Thread(target=work, daemon=True)
+        self.ponder_worker.start()
+
+    def stop_ponder(self):
+        # stop pondering, and return the replies searched until then
+        if self.ponder_worker is not None:
+            self.ponder_stop.set()
+            self.ponder_worker.join()
+            self.ponder_worker = None
+        pondered, self.pondered = self.pondered, {}
+        return pondered
+
+    def search_in_background(self, fn, player, limit, done):
+        # run fn(player, board, limit) on a copy of the board in a worker
+        # thread and call done(action, stats) from the Tk thread once it
+        # returns, stats being the SearchStats of the search
+        results = queue.Queue()
+        board = self.board.clone()
+        stop = self.stop_search
+        game = self.game
+        stats = SearchStats(timing=True)
+
+        def work():
+            try:
+                results.put((fn(player, board, limit, stop=stop, stats=stats), None))
+            except SearchCancelled:
+                pass
+            except Exception as e:
+                results.put((None, e))
+
+        def poll():
+            if game != self.game:
+                return
+            try:
+                action, error = results.get_nowait()
+            except queue.Empty:
+                self.after(20, poll)
+                return
+            self.worker = None
+            if error is not None:
+                raise error
+            done(action, stats)
+
+        self.worker = threading.Thread(target=work, daemon=True)
+        self.worker.start()
+        self.after(20, poll)
+
+    def run_game(self, player1, search_depth1, player2, search_depth2, search_fn, timed_fn=None):
+        self.cancel_search()
+        self.stop_search = threading.Event()
+        self.game += 1
+        game = self.game
+        self.canvas.unbind("<Motion>")
+        self.canvas.unbind("<1>")
         self.clear_canvas()
-        self.terminal_request = False
         self.placement_counter = {self.PLAYER1:0, self.PLAYER2:0}
 
         w = self.canvas.winfo_width()
@@ -234,17 +473,17 @@ class App(tk.Frame):
         self.canvas.create_text(20, 40,
             text=player1, fill="black", font=(None, 10), anchor="nw"
         )
-        if player1 == "Agent":
+        if player1 in ("Agent", "Engine"):
             self.canvas.create_text(20, 55,
-                text="Depth: {}".format(search_depth1), fill="black", font=(None, 10), anchor="nw"
+                text=self.limit_text(search_depth1), fill="black", font=(None, 10), anchor="nw"
             )
         self.draw_checker(self.PLAYER2, w-40, 20)
         self.canvas.create_text(w-20, 40,
             text=player2, fill="black", font=(None, 10), anchor="ne"
         )
-        if player2 == "Agent":
+        if player2 in ("Agent", "Engine"):
             self.canvas.create_text(w-20, 55,
-                text="Depth: {}".format(search_depth2), fill="black", font=(None, 10), anchor="ne"
+                text=self.limit_text(search_depth2), fill="black", font=(None, 10), anchor="ne"
             )
         h -= 10
         self.cell_size = min(
@@ -266,7 +505,7 @@ class App(tk.Frame):
                 board_pos[0] + c*self.cell_size, board_pos[1] + self.BOARD_HEIGHT*self.cell_size,
             )
         
-        self.board = Board(self.BOARD_HEIGHT, self.BOARD_WIDTH)
+        self.board = self.board_cls(self.BOARD_HEIGHT, self.BOARD_WIDTH, self.BOARD_K)
 
         def place(player, col, render=True):
             if self.board.place(player, col):
@@ -314,11 +553,62 @@ class App(tk.Frame):
                 adversary = place(player, loc, render=False)
                 self.canvas.unbind("<Motion>")
                 self.canvas.unbind("<1>")
-                return turn_for(adversary)
+                self.after_idle(turn_for, adversary)
+
+        def play(player, action):
+            if game != self.game:
+                return
+            if action is None:
+                self.prompt("Player {} Gives Up".format(1 if player == self.PLAYER1 else 2))
+                print("Player {} gives up".format(1 if player == self.PLAYER1 else 2))
+            else:
+                adversary = place(player, action)
+                # self.master.bind("<Key>", lambda e: turn_for(adversary))
+                self.after_idle(turn_for, adversary)
+
+        def show_stats(player, stats, pondered=False):
+            print("Player {} {}: {}".format(1 if player == self.PLAYER1 else 2,
+                "pondered search" if pondered else "search", stats
+            ))
+            tag = "stats{}".format(player)
+            self.canvas.delete(tag)
+            text = "{} nodes, {:.0f} ms".format(stats.nodes, stats.time*1000)
+            if pondered:
+                text = "pondered, " + text
+            if player == self.PLAYER1:
+                self.canvas.create_text(20, 70,
+                    text=text, fill="black", font=(None, 10), anchor="nw", tags=tag
+                )
+            else:
+                self.canvas.create_text(w-20, 70,
+                    text=text, fill="black", font=(None, 10), anchor="ne", tags=tag
+                )
+
+        def agent_search(player):
+            # the search fn(player, board, limit) of an agent, and its limit
+            agent = player1 if player == self.PLAYER1 else player2
+            limit = search_depth1 if player == self.PLAYER1 else search_depth2
+            if agent == "Engine":
+                # the engine process keeps its caches between moves
+                timed = not isinstance(limit, int)
+                def engine_fn(player, board, limit, stop=None, stats=None):
+                    engine = self.get_engine(stop)
+                    search = engine.search_timed if timed else engine.search
+                    return search(player, board, limit, stop=stop, stats=stats)
+                if timed:
+                    return engine_fn, int(limit.split()[0])
+                return engine_fn, limit
+            if isinstance(limit, int):
+                return search_fn, limit
+            return timed_fn, int(limit.split()[0])
 
         def turn_for(player):
-            if self.terminal_request:
+            if game != self.game:
                 return
+            if self.board.terminal():
+                # the human's last reply ended the game, there is nothing
+                # left to ponder
+                self.stop_ponder()
             if self.board.has_draw():
                 self.prompt("Draw")
                 print("Game ends in a draw.")
@@ -335,6 +625,14 @@ class App(tk.Frame):
                 x = self.canvas.winfo_pointerx()-self.canvas.winfo_rootx()
                 y = self.canvas.winfo_pointery()-self.canvas.winfo_rooty()
                 human_motion(player, x, y)
+                adversary = self.PLAYER2 if player == self.PLAYER1 else self.PLAYER1
+                opponent = player2 if player == self.PLAYER1 else player1
+                # an engine not started yet is left to the agent's own turn,
+                # which can abandon the start
+                if self.ponder_enabled and (opponent == "Agent" or
+                   opponent == "Engine" and self.engine is not None):
+                    fn, limit = agent_search(adversary)
+                    self.ponder(fn, adversary, limit, player)
             else:
                 print("############################################")
                 if agent == "Random":
@@ -342,16 +640,22 @@ class App(tk.Frame):
                     for c in range(self.board.cols):
                         if self.board.placeable(c):
                             m.append(c)
-                    action = random.choice(m)
-                    time.sleep(0.1)
-                else:
-                    action = search_fn(player, self.board, search_depth1 if player == self.PLAYER1 else search_depth2)
-                if action is None:
-                    self.prompt("Player {} Gives Up".format(1 if player == self.PLAYER1 else 2))
-                    print("Player {} gives up".format(1 if player == self.PLAYER1 else 2))
+                    # a short pause so that random moves can be followed
+                    self.after(100, play, player, random.choice(m))
                 else:
-                    adversary = place(player, action)
-                    # self.master.bind("<Key>", lambda e: turn_for(adversary))
-                    return turn_for(adversary)
+                    fn, limit = agent_search(player)
+                    # the human's move may have been searched already while
+                    # they were thinking
+                    pondered = self.stop_ponder()
+                    last = self.board.last_move()
+                    if last is not None and last[1] in pondered:
+                        action, stats = pondered[last[1]]
+                        show_stats(player, stats, pondered=True)
+                        play(player, action)
+                        return
+                    def done(action, stats):
+                        show_stats(player, stats)
+                        play(player, action)
+                    self.search_in_background(fn, player, limit, done)
 
         turn_for(self.PLAYER1)
@@ -0,0 +1,204 @@
+# bench.py
+# ---------
+# Reproducible benchmarks of the search functions and board primitives.
+#
+# Usage, from the project folder:
+#   python -m utils.bench --depths 1-6 --out bench.json
+#   python -m utils.bench --compare old.json new.json
+#
+# The first form searches a fixed set of opening, midgame and near-endgame
+# positions with minimax, alphabeta and expectimax at each depth, times the
+# board primitives, and writes everything as JSON. The second form prints
+# the change of every timing between two such files and exits with status
+# 1 when one got slower by more than --threshold.
+#
+# --algorithms also takes mtdf and the variants below, e.g. to compare the
+# node counts of alpha-beta, principal variation search and MTD(f), each
+# with a fresh 16 MB transposition table:
+#   python -m utils.bench --algorithms alphabeta alphabeta-pvs mtdf --tt 16
+#
+
+import argparse, json, platform, sys, time, timeit
+
+from .app import Board
+from .bitboard import BitBoard, ScoredBitBoard
+from .notation import parse_moves, play_moves
+from .stats import SearchStats
+from .transposition import TranspositionTable
+
+# name -> move string (see utils.notation), none of them finished
+POSITIONS = {
+    "opening-0": "",
+    "opening-4": "3246",
+    "opening-8": "11751351",
+    "midgame-16": "5211441215417513",
+    "midgame-20": "53576215562315615162",
+    "midgame-24": "416175577336354574171346",
+    "endgame-30": "312453553267556661477767544441",
+    "endgame-34": "4557146376176147672424763164551222",
+}
+
+# name -> (search function of connect4.py, options), benchmarked under the
+# name like the functions themselves
+VARIANTS = {
+    "alphabeta-pvs": ("alphabeta", {"pvs": True}),
+}
+
+BOARDS = {
+    "list": Board,
+    "bit": BitBoard,
+    "scored": ScoredBitBoard,
+}
+
+
+def load_position(name, board_cls=ScoredBitBoard):
+    board = board_cls(6, 7)
+    player = play_moves(board, parse_moves(POSITIONS[name]))
+    return player, board
+
+
+def bench_search(algorithms, depths, board_cls, max_seconds, tt_size_mb=0):
+    """
+    Search every position at every depth. A position is not searched any
+    deeper by an algorithm once one of its searches took more than
+    max_seconds, as the next depth would take several times longer. With
+    tt_size_mb, every minimax, alphabeta and mtdf search gets a fresh
+    transposition table of that size.
+    """
+    import connect4
+    res = []
+    for alg in algorithms:
+        fn_name, kwargs = VARIANTS.get(alg, (alg, {}))
+        fn, kwargs = getattr(connect4, fn_name), dict(kwargs)
+        for name in POSITIONS:
+            player, board = load_position(name, board_cls)
+            for depth in depths:
+                stats = SearchStats()
+                if tt_size_mb and alg != "expectimax":
+                    kwargs["tt"] = TranspositionTable(tt_size_mb)
+                t = time.perf_counter()
+                move = fn(player, board, depth, stats=stats, **kwargs)
+                elapsed = time.perf_counter() - t
+                res.append({
+                    "algorithm": alg, "position": name, "depth": depth,
+                    "move": move, "nodes": stats.nodes, "seconds": elapsed,
+                    "nodes_per_sec": stats.nodes/elapsed if elapsed else None
+                })
+                print("{:<10} {:<11} depth {}  move {}  {:>9} nodes  {:8.4f}s".format(
+                    alg, name, depth, move, stats.nodes, elapsed), file=sys.stderr)
+                if elapsed > max_seconds:
+                    break
+    return res
+
+
+def bench_primitives(number):
+    """
+    Microseconds per call of each board primitive, for every board class,
+    on the midgame-20 position.
+    """
+    import connect4
+    res = {}
+    for kind, board_cls in BOARDS.items():
+        player, board = load_position("midgame-20", board_cls)
+        col = next(c for c in range(board.cols) if board.placeable(c))
+
+        def place_undo():
+            board.place(player, col)
+            board.undo()
+
+        calls = {
+            "place+undo": place_undo,
+            "clone": board.clone,
+            "who_wins": board.who_wins,
+            "terminal": board.terminal,
+            "row": lambda: board.row(2),
+            "col": lambda: board.col(2),
+            "evaluate": lambda: connect4.evaluate(player, board),
+            "evaluate after place+undo": lambda: (place_undo(), connect4.evaluate(player, board)),
+        }
+        for op, fn in calls.items():
+            res["{}.{}".format(kind, op)] = timeit.timeit(fn, number=number)/number*1e6
+            print("{:<40} {:10.3f} us".format(kind + "." + op, res["{}.{}".format(kind, op)]), file=sys.stderr)
+    return res
+
+
+def compare(old, new, threshold):
+    """
+    Print the ratio new/old of every timing found in both runs and return
+    the number of them that got slower by more than threshold (0.1 = 10%).
+    """
+    regressions = 0
+    rows = []
+    key = lambda r: (r["algorithm"], r["position"], r["depth"])
+    old_search = {key(r): r for r in old.get("search", [])}
+    for r in new.get("search", []):
+        o = old_search.get(key(r))
+        if o is not None and o["seconds"] > 0:
+            rows.append(("{} {} depth {}".format(*key(r)), o["seconds"], r["seconds"], "s"))
+            if o["move"] != r["move"]:
+                print("move changed: {} {} depth {}: {} -> {}".format(*key(r), o["move"], r["move"]))
+    for op, t in new.get("primitives", {}).items():
+        if op in old.get("primitives", {}):
+            rows.append((op, old["primitives"][op], t, "us"))
+    for name, a, b, unit in rows:
+        ratio = b/a
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("{:<44} {:>12.4f} {:>12.4f} {:<2} {:>7.2f}x{}".format(name, a, b, unit, ratio, flag))
+    return regressions
+
+
+def parse_depths(s):
+    if "-" in s:
+        lo, hi = s.split("-")
+        return list(range(int(lo), int(hi)+1))
+    return [int(d) for d in s.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Connect-4 search benchmarks.")
+    parser.add_argument("--depths", default="1-8", help='e.g. "1-8" or "2,4,6"')
+    parser.add_argument("--algorithms", nargs="+", default=["minimax", "alphabeta", "expectimax"])
+    parser.add_argument("--board", choices=sorted(BOARDS), default="scored")
+    parser.add_argument("--tt", type=float, default=0, metavar="MB",
+        help="give each search but expectimax a fresh transposition table of this size")
+    parser.add_argument("--max-seconds", type=float, default=20,
+        help="do not search a position deeper once a search took longer")
+    parser.add_argument("--number", type=int, default=2000, help="calls per primitive timing")
+    parser.add_argument("--no-search", action="store_true")
+    parser.add_argument("--no-primitives", action="store_true")
+    parser.add_argument("--out", help="JSON file to write, stdout by default")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=0.1,
+        help="slowdown ratio reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+    res = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "board": args.board,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if not args.no_search:
+        res["search"] = bench_search(args.algorithms, parse_depths(args.depths),
+            BOARDS[args.board], args.max_seconds, args.tt)
+    if not args.no_primitives:
+        res["primitives"] = bench_primitives(args.number)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(res, f, indent=1)
+    else:
+        json.dump(res, sys.stdout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# bitboard.py
+# ---------
+# A drop-in replacement for utils.app.Board that keeps the discs of each
+# player in an integer bitboard instead of a list of lists.
+#
+# Each column takes (rows+1) bits, the lowest bit being the bottom slot of
+# the column and the extra top bit always kept empty as a sentinel, so that
+# shifted masks never wrap from one column into the next one. For the
+# standard 6x7 board this gives 7*7 = 49 bits, well inside a 64-bit word;
+# larger boards just use longer Python integers.
+#
+
+from functools import lru_cache
+
+from .windows import weights, windows, slot_windows
+from .transposition import zobrist_keys
+
+
+@lru_cache(maxsize=None)
+def _run_shifts(rows, k):
+    # for each direction, the shifts that AND a mask of discs with itself
+    # until only the ends of runs of k discs are left: runs of 2, 4, ...
+    # and then of k, a few operations whatever k is
+    steps, n = [], 1
+    while 2*n <= k:
+        steps.append(n)
+        n *= 2
+    if n < k:
+        steps.append(k-n)
+    h1 = rows + 1
+    return tuple(tuple(s*d for s in steps) for d in (1, h1, h1-1, h1+1))
+
+
+class BitBoard(object):
+
+    EMPTY_SLOT = 0
+    PLAYER1 = 1
+    PLAYER2 = 2
+
+    def __init__(self, rows, cols, k=4):
+        self.rows = rows
+        self.cols = cols
+        self.k = k                  # discs in a row needed to win
+        self._h1 = rows + 1
+        self._shifts = _run_shifts(rows, k)
+        self._bits = [0, 0, 0]      # indexed by EMPTY_SLOT/PLAYER1/PLAYER2
+        self._heights = [0]*cols    # number of discs in each column
+        self._grid = None           # decoded rows, rebuilt lazily after place
+        self._history = []          # column of every disc placed, in order
+        self._winner = None         # set by the first move that connects k
+        self._win_ply = None        # len(self._history) when the winner was set
+        self._keys = zobrist_keys(rows, cols)
+        self._hash = 0              # Zobrist hash of the disc placement
+        self._mirror_hash = 0       # the same for the left-right mirror image
+
+    def _bit(self, row, col):
+        return 1 << (col*self._h1 + self.rows-1-row)
+
+    def __getitem__(self, key):
+        bit = self._bit(key[0], key[1])
+        if self._bits[self.PLAYER1] & bit:
+            return self.PLAYER1
+        if self._bits[self.PLAYER2] & bit:
+            return self.PLAYER2
+        return self.EMPTY_SLOT
+
+    def get(self, row, col=None):
+        return self.__getitem__(row if col is None else (row, col))
+
+    def occupied(self, row, col=None):
+        return self.__getitem__(row if col is None else (row, col)) != self.EMPTY_SLOT
+
+    def placeable(self, col):
+        return self._heights[col] < self.rows
+
+    def place(self, player, col):
+        assert(player == self.PLAYER1 or player == self.PLAYER2)
+        h = self._heights[col]
+        if h < self.rows:
+            self._bits[player] |= 1 << (col*self._h1 + h)
+            self._heights[col] = h + 1
+            self._hash ^= self._keys[player][(self.rows-1-h)*self.cols + col]
+            self._mirror_hash ^= self._keys[player][(self.rows-h)*self.cols - 1-col]
+            self._grid = None
+            self._history.append(col)
+            if self._winner is None and self._connected(self._bits[player]):
+                self._winner = player
+                self._win_ply = len(self._history)
+            return True
+        raise ValueError("Column {} is not placeable.".format(col))
+
+    def undo(self):
+        if not self._history:
+            raise ValueError("No disc to undo.")
+        if self._win_ply == len(self._history):
+            self._winner = None
+            self._win_ply = None
+        col = self._history.pop()
+        h = self._heights[col] - 1
+        bit = 1 << (col*self._h1 + h)
+        player = self.PLAYER1 if self._bits[self.PLAYER1] & bit else self.PLAYER2
+        self._bits[player] ^= bit
+        self._heights[col] = h
+        self._hash ^= self._keys[player][(self.rows-1-h)*self.cols + col]
+        self._mirror_hash ^= self._keys[player][(self.rows-h)*self.cols - 1-col]
+        self._grid = None
+        return col
+
+    def last_move(self):
+        if not self._history:
+            return None
+        col = self._history[-1]
+        return (self.rows - self._heights[col], col)
+
+    def moves(self):
+        return self._history[:]
+
+    def zobrist(self):
+        return self._hash
+
+    def canonical_key(self):
+        # the same for the position and its mirror image, which have the
+        # same value with mirrored moves
+        return min(self._hash, self._mirror_hash)
+
+    def mirrored(self):
+        # whether canonical_key() is the hash of the mirror image
+        return self._mirror_hash < self._hash
+
+    def canonical_col(self, col):
+        # maps a column of the board to the same column of the canonical
+        # position, and back, as the mirror is its own inverse
+        return self.cols-1-col if self._mirror_hash < self._hash else col
+
+    def has_draw(self):
+        return len(self._history) == self.rows*self.cols
+
+    def _connected(self, bits):
+        for shifts in self._shifts:
+            m = bits
+            for s in shifts:
+                m &= m >> s
+            if m:
+                return True
+        return False
+
+    def who_wins(self):
+        return self._winner
+
+    def terminal(self):
+        return self._winner is not None or self.has_draw()
+
+    def clone(self):
+        b = self.__class__.__new__(self.__class__)
+        b.rows = self.rows
+        b.cols = self.cols
+        b.k = self.k
+        b._h1 = self._h1
+        b._shifts = self._shifts
+        b._bits = self._bits[:]
+        b._heights = self._heights[:]
+        b._grid = self._grid        # never mutated in place, safe to share
+        b._history = self._history[:]
+        b._winner = self._winner
+        b._win_ply = self._win_ply
+        b._keys = self._keys
+        b._hash = self._hash
+        b._mirror_hash = self._mirror_hash
+        return b
+
+    def _decode(self):
+        if self._grid is None:
+            grid = [[self.EMPTY_SLOT]*self.cols for _ in range(self.rows)]
+            p1 = self._bits[self.PLAYER1]
+            for c, h in enumerate(self._heights):
+                shift = c*self._h1
+                for i in range(h):
+                    grid[self.rows-1-i][c] = self.PLAYER1 if (p1 >> (shift+i)) & 1 else self.PLAYER2
+            self._grid = grid
+        return self._grid
+
+    def row(self, r):
+        return self._decode()[r][:]
+
+    def col(self, c):
+        return [r[c] for r in self._decode()]
+
+    def dump(self, indent=0):
+        return "\n".join([" "*indent + "{}".format(self.row(r)) for r in range(self.rows)])
+
+    def __str__(self):
+        return self.dump()
+
+
+class ScoredBitBoard(BitBoard):
+    """
+    BitBoard that also keeps, for both players, the number of discs in every
+    k-slot window and the running total of the window weights, updated on
+    each place/undo. score(player) then gives connect4.evaluate's value
+    without looking at the board.
+    """
+
+    def __init__(self, rows, cols, k=4):
+        super().__init__(rows, cols, k)
+        n = len(windows(rows, cols, k))
+        self._weights = weights(k)
+        self._slot_windows = slot_windows(rows, cols, k)
+        self._counts = [None, [0]*n, [0]*n]     # indexed by PLAYER1/PLAYER2
+        self._scores = [0, 0, 0]
+
+    def place(self, player, col):
+        row = self.rows-1-self._heights[col]
+        super().place(player, col)
+        adversary = self.PLAYER2 if player == self.PLAYER1 else self.PLAYER1
+        mine = self._counts[player]
+        theirs = self._counts[adversary]
+        w = self._weights
+        score = self._scores[player]
+        for i in self._slot_windows[row*self.cols + col]:
+            n = mine[i]
+            if theirs[i] == 0:
+                score += w[n+1] - w[n]
+            elif n == 0:
+                # the window stops counting for the adversary
+                self._scores[adversary] -= w[theirs[i]]
+            mine[i] = n + 1
+        self._scores[player] = score
+        return True
+
+    def undo(self):
+        col = self._history[-1]
+        row = self.rows-self._heights[col]
+        player = self.get(row, col)
+        super().undo()
+        adversary = self.PLAYER2 if player == self.PLAYER1 else self.PLAYER1
+        mine = self._counts[player]
+        theirs = self._counts[adversary]
+        w = self._weights
+        score = self._scores[player]
+        for i in self._slot_windows[row*self.cols + col]:
+            n = mine[i] - 1
+            mine[i] = n
+            if theirs[i] == 0:
+                score -= w[n+1] - w[n]
+            elif n == 0:
+                self._scores[adversary] += w[theirs[i]]
+        self._scores[player] = score
+        return col
+
+    def score(self, player):
+        adversary = self.PLAYER2 if player == self.PLAYER1 else self.PLAYER1
+        return self._scores[player] - self._scores[adversary]
+
+    def clone(self):
+        b = super().clone()
+        b._weights = self._weights
+        b._slot_windows = self._slot_windows
+        b._counts = [None, self._counts[1][:], self._counts[2][:]]
+        b._scores = self._scores[:]
+        return b
@@ -0,0 +1,211 @@
+# book.py
+# ---------
+# Opening book: the best move of every position of the first plies of the
+# game, found offline by a deep alpha-beta search and stored in a sorted
+# binary file that is searched in place through mmap.
+#
+# Build a book from the project folder with
+#   python -m utils.book book.bin --plies 4 --depth 8 --workers 4
+#
+# File layout, little endian: a header (magic "C4BK", version, rows, cols,
+# number of records) followed by fixed-size records (key, move, depth,
+# score) sorted by key. The key is the canonical Zobrist hash of the
+# position xor'ed with the side-to-move key, as in the transposition table,
+# so a position and its mirror image share one record, whose move is a
+# column of the canonical position. The score is from the point of view of
+# the side to move.
+#
+
+import mmap, struct
+from concurrent.futures import ProcessPoolExecutor
+
+from .bitboard import ScoredBitBoard
+from . import worker_state
+from .transposition import zobrist_keys
+
+MAGIC = b"C4BK"
+VERSION = 2
+HEADER = struct.Struct("<4sHBBI")
+RECORD = struct.Struct("<QBBi")
+KEY = struct.Struct("<Q")
+
+
+def position_key(player, board):
+    """
+    The book key of board with player to move, the same for the position
+    and its mirror image.
+    """
+    key = board.canonical_key()
+    if player == board.PLAYER2:
+        key ^= zobrist_keys(board.rows, board.cols)[0][0]
+    return key
+
+
+class OpeningBook(object):
+    """
+    Read-only view of a book file. Nothing is read up front: the file is
+    mapped into memory and each lookup binary-searches it, touching only
+    the few pages it needs, so opening a book is free whatever its size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            self._file.close()
+            raise ValueError("{} is not an opening book".format(path))
+        magic, version, self.rows, self.cols, self._count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or \
+           len(self._mm) != HEADER.size + self._count*RECORD.size:
+            self.close()
+            raise ValueError("{} is not an opening book".format(path))
+        self.hits = 0
+        self.probes = 0
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def probe(self, key):
+        """(move, depth, score) stored for key, or None."""
+        self.probes += 1
+        mm, lo, hi = self._mm, 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = KEY.unpack_from(mm, HEADER.size + mid*RECORD.size)[0]
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                self.hits += 1
+                return RECORD.unpack_from(mm, HEADER.size + mid*RECORD.size)[1:]
+        return None
+
+    def move(self, player, board):
+        """The book move of board with player to move, or None."""
+        if board.rows != self.rows or board.cols != self.cols or getattr(board, "k", 4) != 4:
+            return None
+        entry = self.probe(position_key(player, board))
+        if entry is None:
+            return None
+        move = board.canonical_col(entry[0])
+        return move if board.placeable(move) else None
+
+    def wrap(self, search_fn):
+        """
+        search_fn(player, board, limit, **kwargs) answering from the book
+        when it knows the position, and searching as usual otherwise.
+        """
+        def fn(player, board, limit, **kwargs):
+            move = self.move(player, board)
+            if move is not None:
+                return move
+            return search_fn(player, board, limit, **kwargs)
+        fn.__name__ = getattr(search_fn, "__name__", "search")
+        return fn
+
+
+def book_positions(rows, cols, plies):
+    """
+    The move lists of all distinct positions, with nobody having won yet,
+    reached by the first moves of a game; transpositions are listed once.
+    """
+    board = ScoredBitBoard(rows, cols)
+    seen = set()
+    res = []
+
+    def walk(player, moves):
+        key = position_key(player, board)
+        if key in seen or board.terminal():
+            return
+        seen.add(key)
+        res.append(list(moves))
+        if len(moves) == plies:
+            return
+        adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        for c in range(cols):
+            if board.placeable(c):
+                board.place(player, c)
+                moves.append(c)
+                try:
+                    walk(adversary, moves)
+                finally:
+                    moves.pop()
+                    board.undo()
+
+    walk(board.PLAYER1, [])
+    return res
+
+
+def _search_position(rows, cols, moves, depth):
+    from connect4 import alphabeta
+    board = ScoredBitBoard(rows, cols)
+    player = board.PLAYER1
+    for c in moves:
+        board.place(player, c)
+        player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    score, move = alphabeta(player, board, depth, tt=worker_state.tt,
+        ordering=worker_state.ordering, return_score=True
+    )
+    return position_key(player, board), board.canonical_col(move), depth, score
+
+
+def build(path, rows=6, cols=7, plies=4, depth=8, workers=None, tt_size_mb=64, progress=None):
+    """
+    Search every position of the first plies moves to depth with alphabeta
+    and write the book to path. Returns the number of records written.
+    progress, if given, is called with (done, total) as positions finish.
+    """
+    positions = book_positions(rows, cols, plies)
+    records = []
+    with ProcessPoolExecutor(workers, initializer=worker_state.init_worker, initargs=(tt_size_mb,)) as pool:
+        jobs = pool.map(_search_position,
+            [rows]*len(positions), [cols]*len(positions), positions, [depth]*len(positions),
+            chunksize=8
+        )
+        for key, move, d, score in jobs:
+            records.append((key, move, d, int(score)))
+            if progress is not None:
+                progress(len(records), len(positions))
+    records.sort()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, cols, len(records)))
+        for r in records:
+            f.write(RECORD.pack(*r))
+    return len(records)
+
+
+def main(argv=None):
+    import argparse, sys, time
+    parser = argparse.ArgumentParser(description="Build a Connect-4 opening book.")
+    parser.add_argument("path", help="book file to write")
+    parser.add_argument("--plies", type=int, default=4, help="book positions up to this many moves into the game")
+    parser.add_argument("--depth", type=int, default=8, help="alpha-beta search depth of each position")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, the number of CPUs by default")
+    args = parser.parse_args(argv)
+
+    t = time.perf_counter()
+    n = build(args.path, args.rows, args.cols, args.plies, args.depth, args.workers,
+        progress=lambda done, total: print("\r{}/{} positions".format(done, total), end="", file=sys.stderr)
+    )
+    print(file=sys.stderr)
+    print("{} positions written to {} in {:.1f}s".format(n, args.path, time.perf_counter() - t))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# engine.py
+# ---------
+# A long-running engine process speaking a line-based text protocol on
+# stdin/stdout, in the spirit of UCI, so that process start-up and cache
+# warm-up are paid once per session instead of at every move.
+#
+# Start it from the project folder with
+#   python -m utils.engine --algorithm alphabeta --hash 64
+#
+# Commands, one per line:
+#   position [moves]    the position after the given moves from the empty
+#                       board: a move string such as 4453 (see
+#                       utils.notation), or on boards of more than 9 columns
+#                       the 1-based columns separated by spaces
+#   newgame             the empty board; the caches are kept
+#   go depth N          search to depth N and answer "bestmove C"
+#   go movetime MS      search for MS milliseconds and answer "bestmove C"
+#   stop                end the running search; its bestmove follows
+#   stats               answer one "stats ..." line of counters since start
+#   isready             answer "readyok"
+#   quit
+#
+# Searches deepen one ply at a time on a thread of their own, so that stop,
+# stats and isready are answered while one runs, and write an "info depth D
+# nodes N time MS move C" line after each completed iteration. A stopped
+# search answers with the move of its deepest completed iteration. Moves are
+# 1-based columns, and "bestmove none" means that the game is over. Errors
+# are reported as "info string ..." lines. After a position that could not
+# be set, go answers "info string error ..." and "bestmove none" until a
+# valid position or newgame arrives.
+#
+# The transposition table, the move-ordering history and the endgame solver
+# live as long as the process: positions searched for one move, or in an
+# earlier game, answer lookups of the following searches.
+#
+# EngineClient runs the engine as a subprocess behind the usual
+# fn(player, board, limit, stop=None, stats=None) search interface; it is
+# the "Engine" agent of the GUI.
+#
+
+import os, queue, subprocess, sys, threading, time
+
+from .bitboard import ScoredBitBoard
+from .errors import SearchTimeout, SearchCancelled
+from .notation import parse_moves, format_moves
+from .ordering import MoveOrdering
+from .solver import Solver
+from .stats import SearchStats
+from .transposition import TranspositionTable
+
+ALGORITHMS = ("minimax", "alphabeta", "expectimax")
+
+
+class Engine(object):
+    """
+    The engine side of the protocol: feed it lines with handle(), or run()
+    it on an iterable of lines. Answers are written to out.
+
+    Parameters
+    ----------
+    algorithm: "minimax", "alphabeta" or "expectimax"
+        the search of connect4.py to play with
+    rows, cols, k: int
+        the board and the number of discs in a row to win
+    tt_size_mb: float
+        size of the transposition table, 0 for none
+    solver: int
+        alphabeta solves the game exactly once at most this many cells are
+        empty, 0 never
+    book: str or None
+        path of an opening book (see utils.book) to play alphabeta's first
+        moves from
+    """
+
+    def __init__(self, out=sys.stdout, algorithm="alphabeta", rows=6, cols=7, k=4,
+                 tt_size_mb=64, solver=16, book=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown algorithm {}".format(algorithm))
+        self.out = out
+        self.algorithm = algorithm
+        self.board = ScoredBitBoard(rows, cols, k)
+        self.player = self.board.PLAYER1
+        self.valid = True               # False after a rejected position
+        self.tt = TranspositionTable(tt_size_mb) if tt_size_mb and algorithm != "expectimax" else None
+        self.ordering = MoveOrdering() if algorithm == "alphabeta" else None
+        self.solver = Solver(solver) if solver and algorithm == "alphabeta" else None
+        self.book = None
+        if book is not None and algorithm == "alphabeta":
+            from .book import OpeningBook
+            self.book = OpeningBook(book)
+        self.stats = SearchStats()      # all searches since start
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def send(self, line):
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        """Runs one command line; returns False after quit."""
+        words = line.split()
+        if not words:
+            return True
+        cmd, args = words[0], words[1:]
+        try:
+            if cmd == "quit":
+                self.stop()
+                return False
+            elif cmd == "isready":
+                self.send("readyok")
+            elif cmd == "stop":
+                self.stop()
+            elif cmd == "stats":
+                self.send(self.stats_line())
+            elif cmd == "position":
+                self.stop()
+                self.position(args)
+            elif cmd == "newgame":
+                self.stop()
+                self.position([])
+            elif cmd == "go":
+                self.stop()
+                self.go(args)
+            else:
+                self.send("info string unknown command {}".format(cmd))
+        except ValueError as e:
+            self.send("info string error {}".format(e))
+        return True
+
+    def run(self, lines):
+        for line in lines:
+            if not self.handle(line):
+                return
+        self.stop()
+
+    def position(self, args):
+        """Sets the position after the given moves, see the protocol above."""
+        board = self.board
+        self.valid = False
+        if board.cols <= 9:
+            moves = parse_moves("".join(args))
+        else:
+            moves = [int(a)-1 for a in args]
+        if any(not 0 <= c < board.cols for c in moves):
+            raise ValueError("Columns go from 1 to {}: {}".format(board.cols, " ".join(args)))
+        # keep the discs the new position shares with the current one
+        played = board.moves()
+        common = 0
+        while common < min(len(played), len(moves)) and played[common] == moves[common]:
+            common += 1
+        for _ in range(len(played) - common):
+            board.undo()
+        player = board.PLAYER1 if common % 2 == 0 else board.PLAYER2
+        for i, c in enumerate(moves[common:], common):
+            if board.terminal() or not board.placeable(c):
+                # back to the empty board rather than a half-set position
+                while board.moves():
+                    board.undo()
+                self.player = board.PLAYER1
+                raise ValueError("Move {} ({}) cannot be played.".format(i+1, c+1))
+            board.place(player, c)
+            player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        self.player = player
+        self.valid = True
+
+    def go(self, args):
+        """Starts a search on its own thread, see the protocol above."""
+        depth = movetime_ms = None
+        if len(args) == 2 and args[0] == "depth":
+            depth = int(args[1])
+        elif len(args) == 2 and args[0] == "movetime":
+            movetime_ms = float(args[1])
+        else:
+            raise ValueError("Expected go depth N or go movetime MS.")
+        if not self.valid:
+            # do not answer for a position the driver never sent
+            self.send("info string error no valid position")
+            self.send("bestmove none")
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._search, args=(depth, movetime_ms), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the running search, if any, once it has answered."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _search_kwargs(self):
+        if self.algorithm == "minimax":
+            return {"tt": self.tt}
+        if self.algorithm == "alphabeta":
+            return {"tt": self.tt, "ordering": self.ordering, "solver": self.solver}
+        return {"prune": True}
+
+    def _search(self, depth, movetime_ms):
+        try:
+            move = self._deepen(depth, movetime_ms)
+        except Exception as e:
+            # a driver waits for a bestmove whatever happens
+            self.send("info string error {!r}".format(e))
+            move = None
+        self.send("bestmove {}".format("none" if move is None else move+1))
+
+    def _deepen(self, depth, movetime_ms):
+        import connect4
+        board, player = self.board, self.player
+        if board.terminal():
+            return None
+        if self.book is not None:
+            move = self.book.move(player, board)
+            if move is not None:
+                self.send("info string book")
+                return move
+        fn = getattr(connect4, self.algorithm)
+        kwargs = self._search_kwargs()
+        stats = SearchStats()
+        started = time.perf_counter()
+        deadline = None if movetime_ms is None else started + movetime_ms/1000
+        empty = board.rows*board.cols - len(board.moves())
+        last = empty if depth is None else min(depth, empty)
+        move = None
+        for d in range(1, last+1):
+            if self.algorithm == "alphabeta":
+                kwargs["first"] = move
+            try:
+                move = fn(player, board, d, deadline=deadline, stop=self._stop, stats=stats, **kwargs)
+            except (SearchTimeout, SearchCancelled):
+                break
+            self.send("info depth {} nodes {} time {:.0f} move {}".format(
+                d, stats.nodes, (time.perf_counter() - started)*1000, move+1
+            ))
+        if move is None:
+            # stopped before depth 1 was done, still give a move
+            kwargs.pop("first", None)
+            move = fn(player, board, 1, stats=stats, **kwargs)
+        self.stats.merge(stats)
+        return move
+
+    def stats_line(self):
+        s = self.stats
+        res = "stats searches {} nodes {} time {:.0f} nps {:.0f} cutoffs {}".format(
+            s.searches, s.nodes, s.time*1000, s.nodes/s.time if s.time else 0, s.cutoffs
+        )
+        if self.tt is not None:
+            res += " tt_entries {} tt_probes {} tt_hits {}".format(len(self.tt), self.tt.probes, self.tt.hits)
+        if self.solver is not None:
+            res += " solver_nodes {}".format(self.solver.nodes)
+        return res
+
+
+class EngineClient(object):
+    """
+    Runs `python -m utils.engine` with the given options as a subprocess
+    and searches through it: search and search_timed take the arguments of
+    connect4.alphabeta and alphabeta_timed, so that an instance can stand
+    in for them, e.g. as the engine of the GUI. The board must hold the
+    moves of a game from the empty board, as they are sent by board.moves().
+    One search at a time.
+
+    The constructor waits for the engine to be ready; once stop, a
+    threading.Event, is set it kills the process still starting and raises
+    SearchCancelled instead.
+    """
+
+    def __init__(self, algorithm="alphabeta", rows=6, cols=7, k=4, tt_size_mb=64, solver=16, book=None,
+                 stop=None):
+        cmd = [sys.executable, "-m", "utils.engine", "--algorithm", algorithm,
+            "--rows", str(rows), "--cols", str(cols), "--k", str(k),
+            "--hash", str(tt_size_mb), "--solver", str(solver)
+        ]
+        if book is not None:
+            cmd += ["--book", os.path.abspath(book)]
+        self.cols = cols
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            universal_newlines=True, bufsize=1
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+        self.send("isready")
+        self._wait_ready(stop)
+
+    def _read(self):
+        for line in self._proc.stdout:
+            self._lines.put(line.strip())
+        self._lines.put(None)
+
+    def send(self, line):
+        self._proc.stdin.write(line + "\n")
+        self._proc.stdin.flush()
+
+    def _wait_ready(self, stop):
+        # readyok, or SearchCancelled as soon as stop is set
+        while True:
+            if stop is not None and stop.is_set():
+                self._proc.kill()
+                self._proc.wait()
+                raise SearchCancelled()
+            try:
+                line = self._lines.get(timeout=0.02)
+            except queue.Empty:
+                continue
+            if line is None:
+                raise RuntimeError("The engine exited.")
+            if line == "readyok":
+                return
+
+    def _wait(self, prefix, stop=None, on_line=None):
+        # the first line starting with prefix; sends stop once the event is
+        # set, still waiting for the line, and raises SearchCancelled then
+        stopped = False
+        while True:
+            try:
+                line = self._lines.get(timeout=0.02)
+            except queue.Empty:
+                if stop is not None and stop.is_set() and not stopped:
+                    self.send("stop")
+                    stopped = True
+                continue
+            if line is None:
+                raise RuntimeError("The engine exited.")
+            if line.startswith(prefix):
+                if stopped:
+                    raise SearchCancelled()
+                return line
+            if on_line is not None:
+                on_line(line)
+
+    def _go(self, player, board, limit, stop, stats):
+        moves = board.moves()
+        expected = board.PLAYER1 if len(moves) % 2 == 0 else board.PLAYER2
+        if player != expected:
+            raise ValueError("Player {} is not to move after {} moves.".format(player, len(moves)))
+        if self.cols <= 9:
+            self.send("position " + format_moves(moves))
+        else:
+            self.send("position " + " ".join(str(c+1) for c in moves))
+        nodes = [0]
+
+        def on_line(line):
+            words = line.split()
+            if words[:2] == ["info", "depth"]:
+                nodes[0] = int(words[words.index("nodes")+1])
+
+        if stats is not None:
+            started = stats.start()
+        self.send("go " + limit)
+        try:
+            move = self._wait("bestmove", stop, on_line).split()[1]
+        finally:
+            if stats is not None:
+                stats.nodes += nodes[0]
+                stats.finish(started)
+        return None if move == "none" else int(move)-1
+
+    def search(self, player, board, depth_limit, stop=None, stats=None):
+        return self._go(player, board, "depth {}".format(depth_limit), stop, stats)
+
+    def search_timed(self, player, board, time_budget_ms, stop=None, stats=None):
+        return self._go(player, board, "movetime {}".format(time_budget_ms), stop, stats)
+
+    def stats(self):
+        """The engine's stats line."""
+        self.send("stats")
+        return self._wait("stats")
+
+    def close(self):
+        if self._proc.poll() is None:
+            self.send("quit")
+            self._proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Connect-4 engine speaking a line protocol on stdin/stdout.")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="alphabeta")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--cols", type=int, default=7)
+    parser.add_argument("--k", type=int, default=4, help="discs in a row needed to win")
+    parser.add_argument("--hash", type=float, default=64, help="transposition table size in MB, 0 for none")
+    parser.add_argument("--solver", type=int, default=16, metavar="EMPTY",
+        help="alphabeta solves the game exactly once at most EMPTY cells are empty, 0 never")
+    parser.add_argument("--book", help="opening book file for alphabeta, see utils.book")
+    args = parser.parse_args(argv)
+
+    engine = Engine(sys.stdout, args.algorithm, args.rows, args.cols, args.k, args.hash, args.solver, args.book)
+    engine.run(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# errors.py
+# ---------
+# Exceptions raised from inside the search functions of connect4.py to
+# abandon a search. They live here rather than in connect4.py so that
+# modules importing them see the same classes when connect4.py runs as
+# the __main__ script.
+#
+
+class SearchTimeout(Exception):
+    """
+    Raised from inside a search when its deadline has passed.
+    """
+    pass
+
+
+class SearchCancelled(Exception):
+    """
+    Raised from inside a search when its stop event has been set.
+    """
+    pass
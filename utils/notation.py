@@ -0,0 +1,78 @@
+# notation.py
+# ---------
+# Compact move strings: the columns played from the empty board, numbered
+# from 1 (leftmost) as in the usual Connect-4 notation, e.g. "4453".
+# Player 1 always moves first.
+#
+# Boards can also be read back from the text of Board.dump().
+#
+
+import re
+
+
+def parse_moves(moves):
+    """The 0-based columns of a move string."""
+    moves = moves.strip()
+    if not moves.isdigit() and moves:
+        raise ValueError("Not a move string: {!r}".format(moves))
+    if "0" in moves:
+        raise ValueError("Columns are numbered from 1: {!r}".format(moves))
+    return [int(m)-1 for m in moves]
+
+
+def format_moves(cols):
+    """The move string of a sequence of 0-based columns."""
+    return "".join(str(c+1) for c in cols)
+
+
+def play_moves(board, cols):
+    """
+    Place the discs of the given 0-based columns on board, alternating
+    players from board.PLAYER1, and return the player to move next.
+    Raises ValueError if a column is full or the game ends before the
+    last move; messages give columns numbered from 1, as in move strings.
+    """
+    player = board.PLAYER1
+    for i, c in enumerate(cols):
+        if board.terminal():
+            raise ValueError("The game is over after {} moves.".format(i))
+        if not board.placeable(c):
+            raise ValueError("Move {} ({}) cannot be played, the column is full.".format(i+1, c+1))
+        board.place(player, c)
+        player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    return player
+
+
+def parse_dump(text, rows, cols):
+    """
+    The slots of a board written as by Board.dump(), either one row per
+    line or all rows on a single line, as a list of rows from the top one.
+    """
+    values = [int(v) for v in re.findall(r"\d+", text)]
+    if len(values) != rows*cols:
+        raise ValueError("Expected {} slots, got {}.".format(rows*cols, len(values)))
+    return [values[r*cols:(r+1)*cols] for r in range(rows)]
+
+
+def set_position(board, grid):
+    """
+    Place the discs of grid, rows of slot values from the top one as given
+    by parse_dump, on the empty board and return the player to move next:
+    board.PLAYER1 when both players have as many discs. Raises ValueError
+    if the disc counts cannot come from a game or a disc is floating.
+    """
+    n1 = sum(r.count(board.PLAYER1) for r in grid)
+    n2 = sum(r.count(board.PLAYER2) for r in grid)
+    if n1 != n2 and n1 != n2+1:
+        raise ValueError("Player 1 has {} discs and player 2 has {}.".format(n1, n2))
+    for c in range(board.cols):
+        for r in range(board.rows-1, -1, -1):
+            v = grid[r][c]
+            if v == board.EMPTY_SLOT:
+                if any(grid[above][c] != board.EMPTY_SLOT for above in range(r)):
+                    raise ValueError("Floating disc in column {}.".format(c+1))
+                break
+            if v not in (board.PLAYER1, board.PLAYER2):
+                raise ValueError("Unknown slot value {}.".format(v))
+            board.place(v, c)
+    return board.PLAYER1 if n1 == n2 else board.PLAYER2
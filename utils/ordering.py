@@ -0,0 +1,119 @@
+# ordering.py
+# ---------
+# Move ordering heuristics for the alpha-beta search in connect4.py.
+#
+# Run `python -m utils.ordering [depth]` from the project folder to compare
+# the node counts of alpha-beta with each heuristic turned on in turn.
+#
+
+class MoveOrdering(object):
+    """
+    Decides in which order alphabeta visits the columns at each node.
+
+    Parameters
+    ----------
+    center: boolean
+        static center-out order (3, 2, 4, 1, 5, 0, 6 on 7 columns) instead
+        of left to right
+    tt_move: boolean
+        try first the best move stored for the position in the
+        transposition table (or the previous iteration's best move at the
+        root)
+    killers: boolean
+        try next the last two moves that caused a cutoff at the same ply
+    history: boolean
+        then prefer moves that caused cutoffs anywhere in the tree, weighted
+        by the square of the remaining depth
+    """
+
+    def __init__(self, center=True, tt_move=True, killers=True, history=True):
+        self.center = center
+        self.tt_move = tt_move
+        self.killers = killers
+        self.history = history
+        self._killers = {}          # ply -> [most recent, previous]
+        self._history = {}          # (player, col) -> score
+        self._static = {}           # cols -> static order
+
+    def start(self):
+        """Called at the start of each search."""
+        self._killers.clear()
+        # keep what was learnt by the previous search, with less weight
+        for k in self._history:
+            self._history[k] //= 2
+
+    def order(self, player, cols, ply, hint=None):
+        """
+        The columns to try at a node, best first. hint is the move proposed
+        by the transposition table, or None.
+        """
+        static = self._static.get(cols)
+        if static is None:
+            static = list(range(cols))
+            if self.center:
+                static.sort(key=lambda c: abs(2*c - cols + 1))
+            self._static[cols] = static
+        killers = self._killers.get(ply, ()) if self.killers else ()
+        if self.history:
+            history = self._history
+            res = sorted(static, key=lambda c: -history.get((player, c), 0))
+        else:
+            res = static[:]
+        for c in reversed(killers):
+            res.remove(c)
+            res.insert(0, c)
+        if self.tt_move and hint is not None:
+            res.remove(hint)
+            res.insert(0, hint)
+        return res
+
+    def cutoff(self, player, col, ply, depth):
+        """Records that col caused a cutoff at the given ply."""
+        if self.killers:
+            killers = self._killers.setdefault(ply, [])
+            if col not in killers:
+                killers.insert(0, col)
+                del killers[2:]
+        if self.history:
+            self._history[(player, col)] = self._history.get((player, col), 0) + depth*depth
+
+
+if __name__ == "__main__":
+    import random, sys
+    from connect4 import alphabeta
+    from utils.bitboard import ScoredBitBoard
+    from utils.stats import SearchStats
+    from utils.transposition import TranspositionTable
+
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    rnd = random.Random(0)
+    positions = []
+    while len(positions) < 10:
+        board = ScoredBitBoard(6, 7)
+        player = board.PLAYER1
+        for _ in range(rnd.randint(0, 12)):
+            board.place(player, rnd.choice([c for c in range(board.cols) if board.placeable(c)]))
+            player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        if not board.terminal():
+            positions.append((player, board))
+
+    configs = [
+        ("left to right", None, False),
+        ("center", dict(center=True, tt_move=False, killers=False, history=False), False),
+        ("center, with table", dict(center=True, tt_move=False, killers=False, history=False), True),
+        ("center+tt move", dict(center=True, tt_move=True, killers=False, history=False), True),
+        ("center+tt move+killers", dict(center=True, tt_move=True, killers=True, history=False), True),
+        ("center+tt move+killers+history", dict(), True),
+    ]
+    base = None
+    for name, kwargs, use_tt in configs:
+        stats = SearchStats()
+        for player, board in positions:
+            alphabeta(player, board, depth, stats=stats,
+                ordering=None if kwargs is None else MoveOrdering(**kwargs),
+                tt=TranspositionTable(16) if use_tt else None
+            )
+        base = base or stats.nodes
+        print("{:<32} nodes {:>10}  cutoffs {:>8}  {:6.1%}".format(
+            name, stats.nodes, stats.cutoffs, stats.nodes/base
+        ))
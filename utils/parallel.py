@@ -0,0 +1,189 @@
+# parallel.py
+# ---------
+# Root-parallel versions of the search functions in connect4.py, running
+# on a pool of worker processes that is kept alive across moves.
+#
+# Run `python -m utils.parallel [depth] [workers ...]` from the project folder
+# to time alpha-beta on a fixed position with 1 to N workers.
+#
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from . import worker_state
+
+# lowest value of the shared bound, meaning that no root move is done yet
+NO_BOUND = -2**62
+
+# per-process state of the workers besides utils.worker_state, set by
+# _init_worker
+_bound = None
+
+
+def _init_worker(bound, tt_size_mb):
+    global _bound
+    _bound = bound
+    worker_state.init_worker(tt_size_mb)
+
+
+def _search(search_fn, player, board, depth_limit, max_player, share_bound, kwargs):
+    """
+    Score one position for max_player in a worker process. With share_bound,
+    the search starts from the best root score found so far by any worker
+    and publishes its own score when it is done.
+    """
+    if kwargs.pop("tt", False) and worker_state.tt is not None:
+        kwargs["tt"] = worker_state.tt
+    if kwargs.pop("ordering", False):
+        kwargs["ordering"] = worker_state.ordering
+    if share_bound:
+        bound = _bound.value
+        if bound != NO_BOUND:
+            # one below the best score so far, so that a root move tying
+            # with it still gets an exact score (scores are integers)
+            kwargs["alpha"] = bound - 1
+    score, _ = search_fn(player, board, depth_limit,
+        max_player=max_player, return_score=True, **kwargs
+    )
+    if share_bound:
+        with _bound.get_lock():
+            if score > _bound.value:
+                _bound.value = score
+    return score
+
+
+class ParallelSearch(object):
+    """
+    Spreads the subtrees of the root, split at a given ply, over a pool of
+    worker processes. The pool and each worker's transposition table and
+    move ordering tables live as long as the instance, so they are reused
+    from one move to the next.
+
+    For alphabeta (split at the first ply) the workers share the best root
+    score found so far as a lower bound, which lets later root moves be
+    pruned against it. minimax and expectimax have no bound to share.
+
+    Parameters
+    ----------
+    workers: int or None
+        number of worker processes, the number of CPUs by default
+    split_ply: int
+        depth of the nodes searched as separate tasks; the plies above it
+        are expanded and backed up in the calling process
+    tt_size_mb: float
+        size of the transposition table of each worker, 0 for none
+    """
+
+    def __init__(self, workers=None, split_ply=1, tt_size_mb=16):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.split_ply = split_ply
+        self._bound = multiprocessing.Value("q", NO_BOUND)
+        self._pool = ProcessPoolExecutor(self.workers,
+            initializer=_init_worker, initargs=(self._bound, tt_size_mb)
+        )
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def search(self, search_fn, player, board, depth_limit, **kwargs):
+        """
+        Run search_fn (connect4.minimax, alphabeta or expectimax) in parallel
+        and return the placement it would return when run serially.
+
+        kwargs are passed to search_fn in the workers, except that tt=True
+        and ordering=True select the worker's own table and move ordering.
+        Root moves are tried from left to right, or kwargs["first"] first,
+        as alphabeta does without move ordering.
+        """
+        # compared by name, connect4 may be running as __main__
+        name = search_fn.__name__
+        max_player = player
+        adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+        first = kwargs.pop("first", None)
+        share_bound = name == "alphabeta" and self.split_ply == 1
+        self._bound.value = NO_BOUND
+
+        # expand the top of the tree, submitting the nodes at split_ply
+        def expand(player, board, depth_limit, ply):
+            if depth_limit == 0 or board.terminal() or ply == self.split_ply:
+                return self._pool.submit(_search, search_fn, player, board.clone(),
+                    depth_limit, max_player, share_bound, dict(kwargs)
+                )
+            order = range(board.cols)
+            if ply == 0 and first is not None:
+                order = [first] + [c for c in order if c != first]
+            children = []
+            for c in order:
+                if board.placeable(c):
+                    board.place(player, c)
+                    try:
+                        # expectimax keeps the adversary to move below chance nodes
+                        if name == "expectimax" and player == adversary:
+                            next_player = adversary
+                        else:
+                            next_player = adversary if player == max_player else max_player
+                        children.append((c, expand(next_player, board, depth_limit-1, ply+1)))
+                    finally:
+                        board.undo()
+            return (player, children)
+
+        def backup(node):
+            if not isinstance(node, tuple):
+                return node.result(), None
+            player, children = node
+            values = [(c, backup(child)[0]) for c, child in children]
+            if player != max_player and name == "expectimax":
+                v = 0
+                for c, next_value in values:
+                    v += 1/len(values) * next_value
+                return v, None
+            v, action = (-math.inf if player == max_player else math.inf), None
+            for c, next_value in values:
+                if name == "alphabeta":
+                    # first best child, as alphabeta keeps on ties
+                    better = action is None or (next_value > v if player == max_player else next_value < v)
+                else:
+                    # last best child, as minimax and expectimax keep on ties
+                    better = next_value >= v if player == max_player else next_value <= v
+                if better:
+                    v, action = next_value, c
+            return v, action
+
+        root = expand(player, board, depth_limit, 0)
+        if not isinstance(root, tuple):
+            # a terminal root or depth 0: nothing to choose from
+            root.result()
+            return None
+        return backup(root)[1]
+
+
+if __name__ == "__main__":
+    import sys, time
+    from connect4 import alphabeta
+    from utils.bitboard import ScoredBitBoard
+
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    counts = [int(n) for n in sys.argv[2:]] or [1, 2, 4]
+    board = ScoredBitBoard(6, 7)
+    for i, c in enumerate([3, 3, 2, 4]):
+        board.place(board.PLAYER1 if i % 2 == 0 else board.PLAYER2, c)
+
+    t = time.perf_counter()
+    serial = alphabeta(board.PLAYER1, board, depth)
+    base = time.perf_counter() - t
+    print("serial     move {}  {:7.2f}s".format(serial, base))
+    for n in counts:
+        with ParallelSearch(n, tt_size_mb=0) as search:
+            # start the workers first, the pool is meant to outlive a move
+            search.search(alphabeta, board.PLAYER1, board, 1)
+            t = time.perf_counter()
+            move = search.search(alphabeta, board.PLAYER1, board, depth)
+            elapsed = time.perf_counter() - t
+        print("{:2d} workers move {}  {:7.2f}s  speedup {:.2f}x".format(n, move, elapsed, base/elapsed))
@@ -0,0 +1,229 @@
+# solver.py
+# ---------
+# Exact solver for the end of the game: a negamax search to the last move
+# with win/draw/loss scores, used by connect4.alphabeta once few empty
+# cells remain.
+#
+# The position is copied into two integers laid out like utils.bitboard
+# (rows+1 bits per column, bottom slot lowest): the discs of the player to
+# move and the mask of all discs. Playing a move is then a few integer
+# operations, and a move hands the turn over by xor'ing the mask in.
+#
+# Scores follow the usual convention for solved Connect-4 positions: 0 for
+# a draw, and for a win the number of moves the winner still has when
+# placing the winning disc, plus one, so that quicker wins score higher;
+# a loss is the opposite of the adversary's win.
+#
+
+import time
+
+from .errors import SearchTimeout, SearchCancelled
+from .transposition import TranspositionTable, UPPER
+
+# nodes between two looks at the clock and the stop event
+CHECK_EVERY = 1024
+
+
+class Solver(object):
+    """
+    Solves positions with at most threshold empty cells exactly, or gives
+    up by raising SearchTimeout after time_cap_ms.
+
+    The search is a negamax with alpha-beta pruning that only visits moves
+    that do not hand the adversary an immediate win, ordered by the number
+    of winning threats they create. The root score is found by a sequence
+    of null-window searches narrowing [min, max] until it is known. Upper
+    bounds are kept in a transposition table of its own, keyed so that a
+    position and its mirror image share an entry, whose entries stay valid
+    across moves and games since solved values never change.
+
+    Parameters
+    ----------
+    threshold: int
+        alphabeta hands positions with this many empty cells or fewer to
+        the solver
+    tt_size_mb: float
+        size of the transposition table
+    time_cap_ms: float
+        time a solve may take before it is abandoned, in milliseconds
+    """
+
+    def __init__(self, threshold=16, tt_size_mb=4, time_cap_ms=1000):
+        self.threshold = threshold
+        self.time_cap_ms = time_cap_ms
+        self.tt = TranspositionTable(tt_size_mb)
+        self.nodes = 0
+        self._given_up = set()
+
+    def clear(self):
+        self.tt.clear()
+        self._given_up.clear()
+
+    def applies(self, board):
+        """
+        Whether board is close enough to the end for the solver, which only
+        plays the four-in-a-row game.
+        """
+        if getattr(board, "k", 4) != 4:
+            return False
+        empty = 0
+        for c in range(board.cols):
+            for r in range(board.rows):
+                if board.occupied(r, c):
+                    break
+                empty += 1
+        return empty <= self.threshold
+
+    def solve(self, player, board, deadline=None, stop=None):
+        """
+        Exact score and best column for player to move on board, which must
+        not be terminal.
+
+        Raises SearchTimeout after time_cap_ms or at deadline, whichever
+        comes first, and SearchCancelled once stop is set. A position that
+        timed out is not tried again until clear() is called, so repeated
+        calls (e.g. from iterative deepening) do not pay the time cap twice.
+        """
+        rows, cols = board.rows, board.cols
+        h1 = rows + 1
+        current = mask = moves = 0
+        for c in range(cols):
+            for h in range(rows):
+                r = rows-1-h
+                if not board.occupied(r, c):
+                    break
+                bit = 1 << (c*h1 + h)
+                mask |= bit
+                moves += 1
+                if board.get(r, c) == player:
+                    current |= bit
+        if (current + mask) in self._given_up:
+            raise SearchTimeout()
+
+        cap = time.perf_counter() + self.time_cap_ms/1000
+        if deadline is None or cap < deadline:
+            deadline = cap
+        try:
+            return self._solve(rows, cols, current, mask, moves, deadline, stop)
+        except SearchTimeout:
+            self._given_up.add(current + mask)
+            raise
+
+    def _solve(self, rows, cols, current, mask, moves, deadline, stop):
+        h1 = rows + 1
+        size = rows*cols
+        bottom = sum(1 << (c*h1) for c in range(cols))
+        full = bottom * ((1 << rows) - 1)
+        col_mask = [((1 << rows) - 1) << (c*h1) for c in range(cols)]
+        col_bits = (1 << h1) - 1
+        order = sorted(range(cols), key=lambda c: abs(2*c - cols + 1))
+        tt = self.tt
+        # scores are stored shifted to be positive
+        offset = size
+        solver = self
+
+        def canonical(key):
+            # current + mask keeps each column within its h1 bits, so the
+            # key of the mirror image is the key with its columns reversed
+            mirror = 0
+            for c in range(cols):
+                mirror = (mirror << h1) | ((key >> (c*h1)) & col_bits)
+            return key if key < mirror else mirror
+
+        def winning(position, mask):
+            # empty cells that would connect four for the owner of position
+            r = (position << 1) & (position << 2) & (position << 3)
+            for d in (h1, h1-1, h1+1):
+                p = (position << d) & (position << 2*d)
+                r |= p & (position << 3*d)
+                r |= p & (position >> d)
+                p = (position >> d) & (position >> 2*d)
+                r |= p & (position << d)
+                r |= p & (position >> 3*d)
+            return r & (full ^ mask)
+
+        def non_losing(current, mask):
+            # moves after which the adversary cannot win at once
+            possible = (mask + bottom) & full
+            threats = winning(current ^ mask, mask)
+            forced = possible & threats
+            if forced:
+                if forced & (forced - 1):
+                    # two threats, one of them will be played
+                    return 0
+                possible = forced
+            # and not right below an adversary's winning cell
+            return possible & ~(threats >> 1)
+
+        def negamax(current, mask, moves, alpha, beta):
+            solver.nodes += 1
+            if solver.nodes % CHECK_EVERY == 0:
+                if time.perf_counter() > deadline:
+                    raise SearchTimeout()
+                if stop is not None and stop.is_set():
+                    raise SearchCancelled()
+            nxt = non_losing(current, mask)
+            if nxt == 0:
+                return -((size - moves)//2)
+            if moves >= size - 2:
+                return 0
+            low = -((size - 2 - moves)//2)
+            if alpha < low:
+                alpha = low
+                if alpha >= beta:
+                    return alpha
+            high = (size - 1 - moves)//2
+            key = canonical(current + mask)
+            entry = tt.probe(key)
+            if entry is not None:
+                high = entry[3] - offset
+            if beta > high:
+                beta = high
+                if alpha >= beta:
+                    return beta
+            # most threats created first, then center-out
+            children = []
+            for i, c in enumerate(order):
+                move = nxt & col_mask[c]
+                if move:
+                    threats = bin(winning(current | move, mask)).count("1")
+                    children.append((-threats, i, move))
+            children.sort()
+            for _, _, move in children:
+                score = -negamax(current ^ mask, mask | move, moves+1, -beta, -alpha)
+                if score >= beta:
+                    return score
+                if score > alpha:
+                    alpha = score
+            tt.store(key, moves, UPPER, alpha + offset, None)
+            return alpha
+
+        possible = (mask + bottom) & full
+        win = winning(current, mask) & possible
+        if win:
+            move = win & -win
+            return (size + 1 - moves)//2, next(c for c in order if move & col_mask[c])
+
+        # null-window searches until the score is known
+        lo, hi = -((size - moves)//2), (size + 1 - moves)//2
+        while lo < hi:
+            med = lo + (hi - lo)//2
+            if med <= 0 and lo//2 < med:
+                med = lo//2
+            elif med >= 0 and hi//2 > med:
+                med = hi//2
+            r = negamax(current, mask, moves, med, med + 1)
+            if r <= med:
+                hi = r
+            else:
+                lo = r
+        score = lo
+
+        # the first move reaching the score, with the table now warm
+        nxt = non_losing(current, mask)
+        for c in order:
+            move = nxt & col_mask[c]
+            if move and -negamax(current ^ mask, mask | move, moves+1, -score, -score+1) >= score:
+                return score, c
+        # every move loses, play the first legal one
+        return score, next(c for c in order if possible & col_mask[c])
@@ -0,0 +1,163 @@
+# stats.py
+# ---------
+# Counters filled by the search functions in connect4.py.
+#
+
+import time
+
+
+class SearchStats(object):
+    """
+    Pass an instance as the stats argument of a search to count its work.
+    The counters add up over all the searches an instance is passed to.
+
+    Parameters
+    ----------
+    timing: boolean
+        also measure the time spent in evaluate(), in board.terminal() and
+        in building successor boards; this costs a few timer calls per node,
+        so node counts alone are cheaper to collect
+    """
+
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.searches = 0       # searches the instance was passed to
+        self.time = 0.          # wall time of those searches, in seconds
+        self.nodes = 0          # positions visited, leaves included
+        self.ply_nodes = []     # positions visited at each ply from the root
+        self.evals = 0          # leaves evaluated
+        self.terminals = 0      # won or drawn positions reached before the depth limit
+        self.expanded = 0       # positions whose successors were generated
+        self.children = 0       # successors generated at those positions
+        self.cutoffs = 0        # alpha/beta cutoffs
+        self.cutoff_index = []  # cutoffs caused by the 1st, 2nd, ... child tried
+        self.eval_time = 0.
+        self.terminal_time = 0.
+        self.successor_time = 0.
+
+    @property
+    def branching(self):
+        """Average number of successors visited per expanded position."""
+        return self.children/self.expanded if self.expanded else 0.
+
+    def start(self):
+        self.searches += 1
+        return time.perf_counter()
+
+    def finish(self, started):
+        self.time += time.perf_counter() - started
+
+    def node(self, ply):
+        self.nodes += 1
+        if ply < len(self.ply_nodes):
+            self.ply_nodes[ply] += 1
+        else:
+            self.ply_nodes.extend([0]*(ply - len(self.ply_nodes)) + [1])
+
+    def leaf(self, board, depth_limit):
+        """depth_limit == 0 or board.terminal(), counting terminal positions."""
+        if depth_limit == 0:
+            return True
+        if self.timing:
+            t = time.perf_counter()
+            res = board.terminal()
+            self.terminal_time += time.perf_counter() - t
+        else:
+            res = board.terminal()
+        if res:
+            self.terminals += 1
+        return res
+
+    def evaluate(self, fn, player, board):
+        """fn(player, board), counted as a leaf evaluation."""
+        self.evals += 1
+        if not self.timing:
+            return fn(player, board)
+        t = time.perf_counter()
+        res = fn(player, board)
+        self.eval_time += time.perf_counter() - t
+        return res
+
+    def batch(self, ply, n, elapsed):
+        """n leaves at ply built and evaluated at once in elapsed seconds."""
+        self.expanded += 1
+        self.children += n
+        self.evals += n
+        self.eval_time += elapsed
+        for _ in range(n):
+            self.node(ply)
+
+    def frontier(self, ply, sizes, elapsed):
+        """
+        The children at ply of a position, with n leaves each at ply+1 for
+        n in sizes, built and evaluated at once in elapsed seconds; a child
+        with n == 0 ends the game and is evaluated itself.
+        """
+        self.expanded += 1
+        self.children += len(sizes)
+        for n in sizes:
+            self.node(ply)
+            if n:
+                self.batch(ply+1, n, 0.)
+            else:
+                self.terminals += 1
+                self.evals += 1
+        self.eval_time += elapsed
+
+    def successors(self, children):
+        """Passes through an iterator of successors, counting and timing it."""
+        self.expanded += 1
+        it = iter(children)
+        while True:
+            if self.timing:
+                t = time.perf_counter()
+                child = next(it, None)
+                self.successor_time += time.perf_counter() - t
+            else:
+                child = next(it, None)
+            if child is None:
+                return
+            self.children += 1
+            yield child
+
+    def cutoff(self, index):
+        """A cutoff caused by the child tried index-th (from 0)."""
+        self.cutoffs += 1
+        if index < len(self.cutoff_index):
+            self.cutoff_index[index] += 1
+        else:
+            self.cutoff_index.extend([0]*(index - len(self.cutoff_index)) + [1])
+
+    def merge(self, other):
+        """Adds the counters of another instance to this one."""
+        for name, value in vars(other).items():
+            if name == "timing":
+                continue
+            mine = getattr(self, name)
+            if isinstance(mine, list):
+                mine.extend([0]*(len(value) - len(mine)))
+                for i, v in enumerate(value):
+                    mine[i] += v
+            else:
+                setattr(self, name, mine + value)
+
+    def as_dict(self):
+        res = {
+            k: v for k, v in vars(self).items() if k != "timing"
+        }
+        res["branching"] = self.branching
+        return res
+
+    def __str__(self):
+        res = "nodes {} evals {} terminals {} cutoffs {} branching {:.2f}".format(
+            self.nodes, self.evals, self.terminals, self.cutoffs, self.branching
+        )
+        if self.cutoffs:
+            res += " first-child cutoffs {:.0%}".format(self.cutoff_index[0]/self.cutoffs)
+        res += " time {:.1f}ms".format(self.time*1000)
+        if self.timing:
+            res += " (evaluate {:.1f}ms, terminal {:.1f}ms, successors {:.1f}ms)".format(
+                self.eval_time*1000, self.terminal_time*1000, self.successor_time*1000
+            )
+        res += "\nnodes per ply " + " ".join(str(n) for n in self.ply_nodes)
+        return res
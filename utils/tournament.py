@@ -0,0 +1,184 @@
+# tournament.py
+# ---------
+# Headless round-robin tournament between agents, played on a process pool.
+#
+# Usage, from the project folder:
+#   python -m utils.tournament alphabeta:4 minimax:3 expectimax:3 random \
+#       --games 20 --opening-plies 2 --workers 4 --out results.jsonl
+#
+# An agent is "random" or "<algorithm>:<limit>", where the algorithm is
+# minimax, alphabeta or expectimax and the limit is a search depth ("5") or
+# a time budget per move ("200ms"). Every pair of agents plays --games games,
+# half of them with each agent moving first. Each game starts with
+# --opening-plies random moves so that games between deterministic agents
+# differ. One JSON line per game is appended to --out as soon as the game
+# ends, with the search statistics of every move (see utils.stats), and a
+# win/draw/loss table is printed at the end. --rows, --cols and --k play
+# Connect-K on other boards, e.g. --rows 15 --cols 15 --k 5.
+#
+
+import argparse, itertools, json, random, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .bitboard import ScoredBitBoard
+from .book import OpeningBook
+from .ordering import MoveOrdering
+from .solver import Solver
+from .stats import SearchStats
+from .transposition import TranspositionTable
+
+BOARD_ROWS = 6
+BOARD_COLS = 7
+BOARD_K = 4
+
+
+def make_agent(spec, rnd, book=None, solver=0):
+    """
+    A fn(player, board, stats=None) -> column for the given agent spec.
+    Search agents get their own transposition table and move ordering for
+    the game, and add their work to stats when given one. alphabeta agents
+    play the moves of the opening book at path book, if given, while the
+    game is in it, and solve the game exactly once at most solver cells
+    are empty.
+    """
+    import connect4
+    if spec == "random":
+        return lambda player, board, stats=None: rnd.choice(
+            [c for c in range(board.cols) if board.placeable(c)]
+        )
+    name, limit = spec.split(":")
+    kwargs = {}
+    if name in ("minimax", "alphabeta"):
+        kwargs["tt"] = TranspositionTable(16)
+    if name == "expectimax":
+        kwargs["prune"] = True
+    if name == "alphabeta":
+        kwargs["ordering"] = MoveOrdering()
+        if solver:
+            kwargs["solver"] = Solver(solver)
+    if limit.endswith("ms"):
+        fn = getattr(connect4, name + "_timed")
+        limit = float(limit[:-2])
+    else:
+        fn = getattr(connect4, name)
+        limit = int(limit)
+    if book is not None and name == "alphabeta":
+        fn = OpeningBook(book).wrap(fn)
+    return lambda player, board, stats=None: fn(player, board, limit, stats=stats, **kwargs)
+
+
+def play_game(game, agent1, agent2, opening_plies, seed, timing=False, book=None, solver=0,
+              rows=BOARD_ROWS, cols=BOARD_COLS, k=BOARD_K):
+    """
+    Play one game between two agent specs on a rows-by-cols board with k
+    discs in a row to win, and return its record. The record holds the
+    SearchStats of every searched move, with the time split between
+    evaluation, terminal checks and successor generation if timing.
+    book and solver are passed to make_agent.
+    """
+    rnd = random.Random(seed)
+    board = ScoredBitBoard(rows, cols, k)
+    agents = {
+        board.PLAYER1: make_agent(agent1, rnd, book, solver),
+        board.PLAYER2: make_agent(agent2, rnd, book, solver)
+    }
+    player = board.PLAYER1
+    moves, move_times, move_stats = [], [], []
+    result = None
+    start = time.perf_counter()
+    while not board.terminal():
+        t = time.perf_counter()
+        if len(moves) < opening_plies:
+            col = rnd.choice([c for c in range(board.cols) if board.placeable(c)])
+            stats = None
+        else:
+            stats = SearchStats(timing)
+            col = agents[player](player, board, stats)
+            stats = stats.as_dict() if stats.searches else None
+        move_stats.append(stats)
+        move_times.append(round(time.perf_counter() - t, 6))
+        if col is None:
+            # the agent gives up
+            result = "player2" if player == board.PLAYER1 else "player1"
+            break
+        board.place(player, col)
+        moves.append(col)
+        player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    if result is None:
+        winner = board.who_wins()
+        result = "draw" if winner is None else \
+            "player1" if winner == board.PLAYER1 else "player2"
+    return {
+        "game": game,
+        "player1": agent1,
+        "player2": agent2,
+        "seed": seed,
+        "opening": moves[:opening_plies],
+        "moves": moves,
+        "result": result,
+        "move_times": move_times,
+        "move_stats": move_stats,
+        "time": round(time.perf_counter() - start, 6)
+    }
+
+
+def schedule(agents, games, seed):
+    """
+    (game, agent1, agent2, seed) for every game of the round robin, each
+    pair playing games games with alternating first player.
+    """
+    n = 0
+    for a, b in itertools.combinations(agents, 2):
+        for i in range(games):
+            yield n, (a, b) if i % 2 == 0 else (b, a), seed + n
+            n += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Connect-4 round-robin tournament.")
+    parser.add_argument("agents", nargs="+",
+        help='"random" or "<minimax|alphabeta|expectimax>:<depth or time budget, e.g. 5 or 200ms>"')
+    parser.add_argument("--games", type=int, default=10, help="games per pair of agents")
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves at the start of each game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, the number of CPUs by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="tournament.jsonl", help="JSONL file the game records are appended to")
+    parser.add_argument("--timing", action="store_true",
+        help="record the time spent in evaluation, terminal checks and successor generation per move")
+    parser.add_argument("--book", help="opening book file for the alphabeta agents, see utils.book")
+    parser.add_argument("--solver", type=int, default=0, metavar="EMPTY",
+        help="alphabeta agents solve the game exactly once at most EMPTY cells are empty")
+    parser.add_argument("--rows", type=int, default=BOARD_ROWS)
+    parser.add_argument("--cols", type=int, default=BOARD_COLS)
+    parser.add_argument("--k", type=int, default=BOARD_K, help="discs in a row needed to win")
+    args = parser.parse_args(argv)
+
+    score = {a: [0, 0, 0] for a in args.agents}     # wins, draws, losses
+    with open(args.out, "a") as out, ProcessPoolExecutor(args.workers) as pool:
+        jobs = [
+            pool.submit(play_game, n, a, b, args.opening_plies, seed, args.timing, args.book, args.solver,
+                args.rows, args.cols, args.k)
+            for n, (a, b), seed in schedule(args.agents, args.games, args.seed)
+        ]
+        for i, job in enumerate(as_completed(jobs)):
+            record = job.result()
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            p1, p2 = record["player1"], record["player2"]
+            if record["result"] == "draw":
+                score[p1][1] += 1
+                score[p2][1] += 1
+            else:
+                winner, loser = (p1, p2) if record["result"] == "player1" else (p2, p1)
+                score[winner][0] += 1
+                score[loser][2] += 1
+            print("\r{}/{} games".format(i+1, len(jobs)), end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    print("{:<20} {:>6} {:>6} {:>6}".format("agent", "win", "draw", "loss"))
+    for a in sorted(args.agents, key=lambda a: -score[a][0]):
+        print("{:<20} {:>6} {:>6} {:>6}".format(a, *score[a]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# transposition.py
+# ---------
+# Zobrist keys and a fixed-size transposition table for the search
+# functions in connect4.py.
+#
+
+import random
+from functools import lru_cache
+
+# bound types of a stored score
+EXACT = 0
+LOWER = 1       # the true score is >= the stored one
+UPPER = 2       # the true score is <= the stored one
+
+# rough size of one table entry (a 5-tuple and its ints) in bytes,
+# used to turn the memory cap into a number of slots
+ENTRY_BYTES = 160
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(rows, cols):
+    """
+    Random 64-bit keys for every (player, slot) pair of a rows-by-cols board,
+    indexed as keys[player][row*cols + col], plus a key for the side to move
+    at keys[0][0]. The generator is seeded so that hashes are identical
+    across processes and runs.
+    """
+    rnd = random.Random(rows*1000 + cols)
+    return (
+        (rnd.getrandbits(64),),
+        tuple(rnd.getrandbits(64) for _ in range(rows*cols)),
+        tuple(rnd.getrandbits(64) for _ in range(rows*cols))
+    )
+
+
+class TranspositionTable(object):
+    """
+    Hash table of searched positions with two slots per bucket: one keeping
+    the entry searched to the greatest depth, and one that is always
+    replaced by the newest entry.
+
+    Entries are (key, depth, flag, score, move) tuples with flag in
+    EXACT/LOWER/UPPER.
+    """
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self._buckets = max(1, int(size_mb * 2**20 / ENTRY_BYTES / 2))
+        self.clear()
+
+    def clear(self):
+        self._deep = [None]*self._buckets
+        self._recent = [None]*self._buckets
+        self.hits = 0
+        self.probes = 0
+        self.stores = 0
+
+    def __len__(self):
+        return sum(e is not None for e in self._deep) + \
+               sum(e is not None for e in self._recent)
+
+    def probe(self, key):
+        self.probes += 1
+        i = key % self._buckets
+        e = self._deep[i]
+        if e is not None and e[0] == key:
+            self.hits += 1
+            return e
+        e = self._recent[i]
+        if e is not None and e[0] == key:
+            self.hits += 1
+            return e
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        self.stores += 1
+        i = key % self._buckets
+        entry = (key, depth, flag, score, move)
+        deep = self._deep[i]
+        if deep is None or deep[0] == key or deep[1] <= depth:
+            self._deep[i] = entry
+            if deep is not None and deep[0] != key:
+                self._recent[i] = deep
+        else:
+            self._recent[i] = entry
@@ -0,0 +1,122 @@
+# vectorized.py
+# ---------
+# NumPy version of connect4.evaluate scoring many boards in one call.
+#
+# NumPy is optional: the rest of the project runs without it, and only the
+# functions below raise ImportError when it is missing.
+#
+
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .windows import weights, windows
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for batched evaluation")
+
+
+@lru_cache(maxsize=None)
+def _window_index(rows, cols, k):
+    # (n_windows, k) flat slot indices, and the weights as an array
+    return np.array(windows(rows, cols, k), dtype=np.intp), np.array(weights(k), dtype=np.int64)
+
+
+def evaluate_batch(player, boards, k=4):
+    """
+    Evaluate the advantage of player on a stack of boards at once.
+
+    Parameters
+    ----------
+    player: PLAYER1 (1) or PLAYER2 (2)
+        the specific player
+    boards: array of shape (N, rows, cols)
+        the discs of N boards, as EMPTY_SLOT/PLAYER1/PLAYER2 values laid out
+        like Board.row(r) for r in range(rows)
+    k: int
+        the number of discs in a row that wins
+
+    Returns
+    -------
+    scores: int64 array of shape (N,)
+        connect4.evaluate(player, board) for each of the N boards
+    """
+    _require_numpy()
+    boards = np.asarray(boards)
+    n, rows, cols = boards.shape
+    index, w = _window_index(rows, cols, k)
+    adversary = 2 if player == 1 else 1
+    flat = boards.reshape(n, rows*cols)
+    # number of discs of each player in each window, (N, n_windows)
+    mine = (flat == player)[:, index].sum(axis=2)
+    theirs = (flat == adversary)[:, index].sum(axis=2)
+    # a window only counts for a player the adversary has no disc in
+    reward = np.where(theirs == 0, w[mine], 0).sum(axis=1)
+    penalty = np.where(mine == 0, w[theirs], 0).sum(axis=1)
+    return reward - penalty
+
+
+def board_array(board):
+    """
+    The discs of a board instance as an int8 array of shape (rows, cols).
+    """
+    _require_numpy()
+    return np.array([board.row(r) for r in range(board.rows)], dtype=np.int8)
+
+
+def child_arrays(player, board):
+    """
+    All successors of board for player, without building board instances.
+
+    Returns
+    -------
+    cols: list of int
+        the placeable columns, from left to right
+    children: int8 array of shape (len(cols), rows, cols)
+        the board after placing a disc in each of those columns
+    """
+    base = board_array(board)
+    cols = [c for c in range(board.cols) if board.placeable(c)]
+    children = np.repeat(base[np.newaxis], len(cols), axis=0)
+    for i, c in enumerate(cols):
+        # lowest empty slot of the column
+        r = int(np.count_nonzero(base[:, c] == board.EMPTY_SLOT)) - 1
+        children[i, r, c] = player
+    return cols, children
+
+
+def grandchild_arrays(player, adversary, board):
+    """
+    The successors of board for player and, below each of them, its own
+    successors for adversary, stacked for a single evaluate_batch call.
+    A successor that ends the game stands for itself in the stack.
+
+    Returns
+    -------
+    children: list of (int, int)
+        for each placeable column of board from left to right, the column
+        and the number of boards it has in the stack, 0 when it ends the
+        game and is in the stack itself
+    boards: int8 array of shape (N, rows, cols)
+        the boards of the children, one after the other
+    """
+    children, stacks = [], []
+    for c in range(board.cols):
+        if board.placeable(c):
+            board.place(player, c)
+            try:
+                if board.terminal():
+                    children.append((c, 0))
+                    stacks.append(board_array(board)[np.newaxis])
+                else:
+                    cols, grandchildren = child_arrays(adversary, board)
+                    children.append((c, len(cols)))
+                    stacks.append(grandchildren)
+            finally:
+                board.undo()
+    return children, np.concatenate(stacks)
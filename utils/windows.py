@@ -0,0 +1,65 @@
+# windows.py
+# ---------
+# Index tables of the K-slot segments (windows) of a game board, shared by
+# the boards and evaluators that score the board window by window. Tables
+# are built once for each (rows, cols, K) and cached.
+#
+# Slots are addressed by their flat index row*cols + col, with row 0 being
+# the top row as in Board.get(row, col).
+#
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def weights(k=4):
+    """
+    Weight of a window holding 0, 1, ..., k discs of a single player: 0 for
+    none, then four times more for each extra disc, and 1000 for a full
+    window (1000 times 4**(k-4) for k > 4, so that it still outweighs the
+    rest).
+    """
+    return (0,) + tuple(4**(n-1) for n in range(1, k)) + (1000 * 4**max(k-4, 0),)
+
+
+# weight of a window holding 0, 1, 2, 3 or 4 discs of a single player,
+# the same as the weights used by connect4.evaluate on Connect-4 boards
+WEIGHTS = weights(4)
+
+
+@lru_cache(maxsize=None)
+def windows(rows, cols, k=4):
+    """
+    All k-slot segments of a rows-by-cols board: horizontal, vertical,
+    slash and backslash, as tuples of flat slot indices.
+    """
+    res = []
+    for dr, dc in ((0, 1), (1, 0), (1, -1), (1, 1)):
+        for r in range(rows):
+            for c in range(cols):
+                er, ec = r + (k-1)*dr, c + (k-1)*dc
+                if 0 <= er < rows and 0 <= ec < cols:
+                    res.append(tuple((r+i*dr)*cols + c+i*dc for i in range(k)))
+    return tuple(res)
+
+
+@lru_cache(maxsize=None)
+def slot_windows(rows, cols, k=4):
+    """
+    For each flat slot index, the indices (in windows(rows, cols, k)) of
+    the windows passing through that slot.
+    """
+    res = [[] for _ in range(rows*cols)]
+    for i, w in enumerate(windows(rows, cols, k)):
+        for s in w:
+            res[s].append(i)
+    return tuple(tuple(r) for r in res)
+
+
+def score_bound(rows, cols, k=4):
+    """
+    A bound on the absolute value of connect4.evaluate on a rows-by-cols
+    board: no player can score more than the weight of k discs in every
+    window.
+    """
+    return len(windows(rows, cols, k)) * weights(k)[-1]
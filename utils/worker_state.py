@@ -0,0 +1,25 @@
+# worker_state.py
+# ---------
+# Per-process search state of the worker pools of utils.parallel,
+# utils.book and utils.analyze: a transposition table and a move ordering
+# history, made once in each worker process and kept for all the tasks it
+# runs. Read them as worker_state.tt and worker_state.ordering at the time
+# of the search, as they are only set once the pool has started.
+#
+
+from .ordering import MoveOrdering
+from .transposition import TranspositionTable
+
+# set by init_worker
+tt = None
+ordering = None
+
+
+def init_worker(tt_size_mb):
+    """
+    Initializer of a worker process: a fresh transposition table of
+    tt_size_mb, or none if it is 0, and a fresh move ordering.
+    """
+    global tt, ordering
+    tt = TranspositionTable(tt_size_mb) if tt_size_mb else None
+    ordering = MoveOrdering()